@@ -1,3 +1,247 @@
-from django.contrib import admin
+"""Admin for django queues
 
-# Register your models here.
+Queues can hold millions of entries, so the `Entry` changelist is built to
+not slow down as they grow:
+
+* Entries are paginated by seeking past the last `(queue, order)` shown
+  rather than with OFFSET, so the cost of a page doesn't depend on its depth.
+* The number of entries is estimated rather than counted with `COUNT(*)`.
+* Items are fetched in bulk, one query per content type, for display.
+"""
+from typing import NamedTuple
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from queues.models import Entry, Queue
+
+AFTER_VAR = 'after'
+
+# Filtered querysets are counted up to this many rows
+COUNT_LIMIT = 10000
+
+
+class Estimate(NamedTuple):
+    """An estimated number of rows"""
+    count: int
+    exact: bool
+    capped: bool  # counting stopped at the limit
+
+
+def estimate_count(queryset: QuerySet, limit: int = COUNT_LIMIT) -> Estimate:
+    """Return an estimate of the number of rows in `queryset`
+
+    For an unfiltered queryset the database's table statistics are used when
+    available.  Otherwise rows are only counted up to `limit`.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                    [table],
+                )
+                row = cursor.fetchone()
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    'SELECT table_rows FROM information_schema.tables'
+                    ' WHERE table_schema = DATABASE() AND table_name = %s',
+                    [table],
+                )
+                row = cursor.fetchone()
+            else:
+                row = None
+
+        # Tables that haven't been analyzed yet have no (or negative) stats
+        if row and row[0] is not None and row[0] >= 0:
+            return Estimate(int(row[0]), exact=False, capped=False)
+
+    count = queryset.order_by()[:limit].count()
+
+    return Estimate(count, exact=count < limit, capped=count >= limit)
+
+
+class EstimatedCountPaginator(Paginator):
+    """`Paginator` whose count is estimated by `estimate_count()`"""
+    @cached_property
+    def _estimate(self) -> Estimate:
+        return estimate_count(self.object_list)
+
+    @cached_property
+    def count(self) -> int:
+        return self._estimate.count
+
+    @cached_property
+    def exact(self) -> bool:
+        return self._estimate.exact
+
+    @cached_property
+    def capped(self) -> bool:
+        return self._estimate.capped
+
+
+class KeysetChangeList(ChangeList):
+    """`ChangeList` paginated by seeking on `(queue, order)`
+
+    Instead of page numbers, the `after` query parameter holds the
+    `queue_id-order` of the last entry on the previous page.
+    """
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        return ['queue_id', 'order']
+
+    def get_results(self, request):
+        queryset = self.queryset
+        after = self.params.get(AFTER_VAR)
+
+        if after:
+            try:
+                queue_id, order = (int(i) for i in after.split('-'))
+            except ValueError:
+                raise IncorrectLookupParameters
+
+            queryset = queryset.filter(
+                Q(queue_id=queue_id, order__gt=order)
+                | Q(queue_id__gt=queue_id)
+            )
+
+        per_page = self.list_per_page
+        result_list = list(queryset[:per_page + 1])
+        has_next = len(result_list) > per_page
+        result_list = result_list[:per_page]
+
+        paginator = self.model_admin.get_paginator(
+            request, self.queryset, per_page
+        )
+
+        if has_next:
+            last = result_list[-1]
+            self.next_url = self.get_query_string(
+                {AFTER_VAR: f'{last.queue_id}-{last.order}'}
+            )
+        else:
+            self.next_url = None
+
+        if after:
+            self.first_url = self.get_query_string(remove=[AFTER_VAR])
+        else:
+            self.first_url = None
+
+        if paginator.exact:
+            self.result_count_display = str(paginator.count)
+        elif paginator.capped:
+            self.result_count_display = f'{paginator.count}+'
+        else:
+            self.result_count_display = f'about {paginator.count}'
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = has_next or bool(after)
+        self.paginator = paginator
+
+
+class QueueActionForm(ActionForm):
+    target = forms.IntegerField(
+        required=False, label='Target queue', min_value=1
+    )
+
+
+@admin.register(Queue)
+class QueueAdmin(admin.ModelAdmin):
+    list_display = ('id', 'entries_link')
+    action_form = QueueActionForm
+    actions = ['clear_queues', 'shuffle_queues', 'compact_queues',
+               'move_queues']
+
+    def entries_link(self, obj):
+        url = reverse('admin:queues_entry_changelist')
+
+        return format_html(
+            '<a href="{}?queue__id__exact={}">Entries</a>', url, obj.pk
+        )
+    entries_link.short_description = 'entries'
+
+    def clear_queues(self, request, queryset):
+        for queue in queryset:
+            queue.clear()
+    clear_queues.short_description = 'Clear selected queues'
+
+    def shuffle_queues(self, request, queryset):
+        for queue in queryset:
+            queue.shuffle()
+    shuffle_queues.short_description = 'Shuffle selected queues'
+
+    def compact_queues(self, request, queryset):
+        for queue in queryset:
+            queue.compact()
+    compact_queues.short_description = 'Compact selected queues'
+
+    def move_queues(self, request, queryset):
+        try:
+            target = Queue.objects.get(pk=request.POST.get('target'))
+        except (Queue.DoesNotExist, ValueError):
+            self.message_user(
+                request, 'A valid target queue is required', messages.ERROR
+            )
+            return
+
+        for queue in queryset:
+            queue.move(target)
+    move_queues.short_description = 'Move selected queues to target queue'
+
+
+@admin.register(Entry)
+class EntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'queue_link', 'order', 'available_at', 'item_type',
+                    'item_display')
+    list_display_links = ('id',)
+    list_per_page = 100
+    paginator = EstimatedCountPaginator
+    raw_id_fields = ('queue',)
+    show_full_result_count = False
+    sortable_by = ()
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+
+        return queryset.select_related('queue').prefetch_related('item')
+
+    def queue_link(self, obj):
+        url = reverse('admin:queues_queue_change', args=[obj.queue_id])
+
+        return format_html('<a href="{}">{}</a>', url, obj.queue_id)
+    queue_link.short_description = 'queue'
+
+    def item_type(self, obj):
+        return ContentType.objects.get_for_id(obj.content_type_id)
+    item_type.short_description = 'type'
+
+    def item_display(self, obj):
+        return obj.item
+    item_display.short_description = 'item'
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class QueuesConfig(AppConfig):
     name = 'queues'
+
+    def ready(self):
+        # Connect the signal receivers
+        from queues import listener  # noqa: F401
@@ -0,0 +1,154 @@
+"""Instrumentation for `Queue` operations
+
+Each instrumented operation (`push`, `pop`, `extend`, etc.) is timed, and the
+queries it runs are counted.  The results are sent as the
+`queues.signals.queue_operation` signal and, if configured, passed to a
+metrics backend::
+
+    QUEUES_METRICS_BACKEND = 'myproject.metrics.StatsdBackend'
+
+Where the backend is a subclass of `MetricsBackend`.  If there are no
+receivers of the signal and no metrics backend then the operation is called
+directly, so the overhead of instrumentation is a couple of checks.
+
+Operations that raise are reported too, with the name of the exception as
+the `error`, before it is re-raised.
+
+Reporting the depth of the queue after each operation costs an extra
+`COUNT(*)`, so it is only done if `QUEUES_METRICS_DEPTH` is `True`, and not
+for operations that raised.
+"""
+import abc
+import functools
+import time
+from typing import Callable, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from queues.signals import queue_operation
+
+
+class OperationMetrics(NamedTuple):
+    """Metrics for a single `Queue` operation"""
+    operation: str
+    duration: float  # seconds
+    queries: int
+    rows: int  # rows affected by INSERT/UPDATE/DELETE
+    lock_wait: float  # seconds spent in SELECT ... FOR UPDATE
+    depth: Optional[int]
+    error: Optional[str] = None  # name of the exception raised, if any
+
+
+class MetricsBackend(abc.ABC):
+    """Interface for metrics backends
+
+    Subclasses must implement `record()`.
+    """
+    @abc.abstractmethod
+    def record(self, queue, metrics: OperationMetrics) -> None:
+        """Record the `metrics` for an operation on `queue`"""
+
+
+_backend = None
+_backend_loaded = False
+
+
+def get_backend() -> Optional[MetricsBackend]:
+    """Return the configured metrics backend, or `None`"""
+    global _backend, _backend_loaded
+
+    if not _backend_loaded:
+        path = getattr(settings, 'QUEUES_METRICS_BACKEND', None)
+        _backend = import_string(path)() if path else None
+        _backend_loaded = True
+
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(*, setting, **kwargs) -> None:
+    global _backend_loaded
+
+    if setting == 'QUEUES_METRICS_BACKEND':
+        _backend_loaded = False
+
+
+class QueryCounter:
+    """Database execute wrapper which counts queries, rows and lock waits"""
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.lock_wait = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+
+            if 'FOR UPDATE' in sql:
+                self.lock_wait += time.perf_counter() - start
+            elif not sql.lstrip().upper().startswith('SELECT'):
+                self.rows += max(context['cursor'].rowcount, 0)
+
+
+def instrument(operation: str) -> Callable:
+    """Decorator to instrument the `Queue` method as `operation`"""
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            backend = get_backend()
+
+            if backend is None and not queue_operation.has_listeners():
+                return method(self, *args, **kwargs)
+
+            # Entries, and so the queries, are in the queue's database
+            connection = connections[self._get_db()]
+            counter = QueryCounter()
+            error = None
+            start = time.perf_counter()
+
+            try:
+                with connection.execute_wrapper(counter):
+                    return method(self, *args, **kwargs)
+            except BaseException as exc:
+                error = type(exc).__name__
+                raise
+            finally:
+                duration = time.perf_counter() - start
+                report(self, backend, operation, duration, counter, error)
+
+        return wrapper
+
+    return decorator
+
+
+def report(queue, backend: Optional[MetricsBackend], operation: str,
+           duration: float, counter: QueryCounter,
+           error: Optional[str]) -> None:
+    """Send the metrics of an `operation` on `queue` to its receivers"""
+    if error is None and getattr(settings, 'QUEUES_METRICS_DEPTH', False):
+        depth = queue.count()
+    else:
+        depth = None
+
+    metrics = OperationMetrics(
+        operation=operation,
+        duration=duration,
+        queries=counter.queries,
+        rows=counter.rows,
+        lock_wait=counter.lock_wait,
+        depth=depth,
+        error=error,
+    )
+
+    if backend is not None:
+        backend.record(queue, metrics)
+
+    queue_operation.send(sender=type(queue), queue=queue, metrics=metrics)
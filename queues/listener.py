@@ -0,0 +1,109 @@
+"""Waking long-poll waiters in other processes
+
+`queues.views.pop_entry()` waits on a condition that is only notified by
+pushes in its own process.  On PostgreSQL pushes also send a `NOTIFY`, which
+is delivered when their transaction commits, and each process runs a
+listener thread per database that passes the notifications on to its
+waiters.  Other databases have no equivalent, and there waiters in other
+processes only see the push when they next check the queue (see
+`QUEUES_LONG_POLL_INTERVAL`).
+"""
+import select
+import threading
+from typing import Callable, Dict
+
+from django.db import connections
+from django.dispatch import receiver
+
+from queues.signals import entries_added
+
+CHANNEL = 'queues_entries_added'
+
+# Seconds the listener waits for a notification before checking again
+SELECT_TIMEOUT = 5
+
+# Longest to wait for a new listener to start listening, in seconds
+START_TIMEOUT = 5
+
+_listeners: Dict[str, threading.Thread] = {}
+_listeners_lock = threading.Lock()
+
+
+def is_supported(using: str) -> bool:
+    """Return `True` if notifications can be sent on the `using` database"""
+    return connections[using].vendor == 'postgresql'
+
+
+def send(queue_id: int, using: str) -> None:
+    """Notify listeners that entries were added to the queue
+
+    The notification is sent when the current transaction on the `using`
+    database commits, and not at all if it rolls back.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, str(queue_id)])
+
+
+@receiver(entries_added)
+def _entries_added(sender, queue, **kwargs) -> None:
+    # Processes that push don't necessarily serve pop_entry(), so this is
+    # connected when the app is ready rather than by the views
+    db = queue._get_db()
+
+    if is_supported(db):
+        send(queue.pk, db)
+
+
+def listen(using: str, callback: Callable[[int], None]) -> None:
+    """Call `callback(queue_id)` for notifications sent on `using`
+
+    The notifications are received by a thread, which is started if it isn't
+    running already.  Return once it is listening.
+    """
+    with _listeners_lock:
+        thread = _listeners.get(using)
+
+        if thread is not None and thread.is_alive():
+            return
+
+        listening = threading.Event()
+        thread = _listeners[using] = threading.Thread(
+            target=_listen,
+            args=(using, callback, listening),
+            name=f'queues-listener-{using}',
+            daemon=True,
+        )
+        thread.start()
+
+    listening.wait(START_TIMEOUT)
+
+
+def _listen(using: str, callback: Callable[[int], None],
+            listening: threading.Event) -> None:
+    # The listener needs a connection of its own, outside of Django's
+    # per-thread connection handling, that stays in autocommit
+    wrapper = connections[using]
+    connection = wrapper.get_new_connection(wrapper.get_connection_params())
+    connection.autocommit = True
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+
+        listening.set()
+
+        while True:
+            readable, _, _ = select.select(
+                [connection], [], [], SELECT_TIMEOUT
+            )
+
+            if not readable:
+                continue
+
+            connection.poll()
+
+            while connection.notifies:
+                notification = connection.notifies.pop(0)
+                callback(int(notification.payload))
+    finally:
+        connection.close()
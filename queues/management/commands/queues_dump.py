@@ -0,0 +1,94 @@
+"""Stream queue entries out of the database
+
+Entries are written as newline-delimited JSON, one entry per line::
+
+    [queue_id, "app_label.model", object_id, order, available_at]
+
+Entries are read from the database in keyset chunks on `(queue, order)`, so
+memory use stays constant no matter how large the queues are.
+"""
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+
+from queues.models import Queue
+
+CHUNK_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = 'Dump queue entries as newline-delimited JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'queue_ids', metavar='queue_id', nargs='*', type=int,
+            help='Queue(s) to dump. Dumps every queue if not given.',
+        )
+        parser.add_argument(
+            '-o', '--output', default=None,
+            help='File to write to. Defaults to standard output.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Number of entries to read per query.',
+        )
+
+    def handle(self, *args, **options):
+        queue_ids = options['queue_ids']
+        chunk_size = options['chunk_size']
+
+        if not queue_ids:
+            queue_ids = Queue.objects.order_by('pk').values_list(
+                'pk', flat=True
+            ).iterator()
+
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                self.dump(fp, queue_ids, chunk_size)
+        else:
+            self.dump(self.stdout, queue_ids, chunk_size)
+
+    def dump(self, fp, queue_ids, chunk_size):
+        """Write the entries of each queue in `queue_ids` to `fp`"""
+        natural_keys = {}
+
+        for queue_id in queue_ids:
+            for chunk in iter_chunks(queue_id, chunk_size):
+                lines = []
+
+                for content_type_id, object_id, order, available_at in chunk:
+                    try:
+                        natural_key = natural_keys[content_type_id]
+                    except KeyError:
+                        content_type = ContentType.objects.get_for_id(
+                            content_type_id
+                        )
+                        natural_key = json.dumps(
+                            '.'.join(content_type.natural_key())
+                        )
+                        natural_keys[content_type_id] = natural_key
+
+                    # The rest are ints and an ISO 8601 string, which need
+                    # no escaping, so skip the JSON encoder for them
+                    lines.append(
+                        f'[{queue_id},{natural_key},{object_id},{order},'
+                        f'"{available_at.isoformat()}"]'
+                    )
+
+                lines.append('')
+                fp.write('\n'.join(lines))
+
+
+def iter_chunks(queue_id, chunk_size):
+    """Yield chunks of the entries of the queue with `queue_id`
+
+    Entries are fetched as `(content_type_id, object_id, order,
+    available_at)` rows rather than model instances.
+    """
+    queue = Queue(pk=queue_id)
+    queryset = queue.entries.values_list(
+        'content_type_id', 'object_id', 'order', 'available_at', named=True
+    )
+
+    return queue.iter_chunks(chunk_size, queryset)
@@ -0,0 +1,267 @@
+"""Load queue entries written by the `queues_dump` command
+
+Input is read a line at a time and written with one `executemany()` per
+batch, so memory use stays constant no matter how large the dump is.  Rows
+go straight from the dump to the database without creating an `Entry` for
+each of them.  Queues that do not exist are created.  Queues that already
+have entries are refused, since the dumped orders would collide with the
+existing ones.
+"""
+import json
+import sys
+from contextlib import ExitStack
+from datetime import datetime
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from queues.models import Entry, Queue
+
+BATCH_SIZE = 10000
+
+# The columns of the entries table that are loaded, in the order of the rows
+FIELDS = ('queue', 'content_type', 'object_id', 'order', 'available_at')
+
+
+def is_id(value):
+    """Return `True` if `value` can be an id (or order) of an entry"""
+    return type(value) is int and value >= 0
+
+
+def parse_available_at(value):
+    """Parse the `available_at` of a dumped entry
+
+    Dumps are written with `isoformat()`, which `datetime.fromisoformat()`
+    reads much faster than `parse_datetime()`, on Pythons that have it.
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except (AttributeError, ValueError):
+        available_at = parse_datetime(value)
+
+    if available_at is None:
+        raise ValueError(value)
+
+    return available_at
+
+
+def get_insert_sql(connection):
+    """Return the SQL to insert a row of `FIELDS` into the entries table"""
+    quote_name = connection.ops.quote_name
+    columns = ', '.join(
+        quote_name(Entry._meta.get_field(name).column) for name in FIELDS
+    )
+    params = ', '.join(['%s'] * len(FIELDS))
+
+    return (
+        f'INSERT INTO {quote_name(Entry._meta.db_table)} ({columns})'
+        f' VALUES ({params})'
+    )
+
+
+class Command(BaseCommand):
+    help = 'Load queue entries from newline-delimited JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', nargs='?', default='-',
+            help='File to read from. Defaults to standard input.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Number of entries to create per query.',
+        )
+
+    def handle(self, *args, **options):
+        filename = options['input']
+
+        if filename == '-':
+            count = self.load(sys.stdin, options['batch_size'])
+        else:
+            with open(filename) as fp:
+                count = self.load(fp, options['batch_size'])
+
+        if options['verbosity'] >= 1:
+            self.stdout.write(f'Loaded {count} entries')
+
+    def load(self, fp, batch_size):
+        """Load the entries in `fp`. Return the number of entries loaded"""
+        content_type_ids = {}
+        queue_dbs = {}
+        batch = []
+        batch_db = batch_queue_id = batch_lineno = None
+        db_values = {}
+        count = 0
+
+        # Queues are created in the default database but their entries may
+        # be written to others.  Load into all of them, or none.
+        with ExitStack() as atomic_dbs:
+            queue_db = router.db_for_write(Queue)
+            atomic_dbs.enter_context(transaction.atomic(queue_db))
+            dbs = {queue_db}
+
+            for lineno, line in enumerate(fp, 1):
+                if not line.strip():
+                    continue
+
+                try:
+                    entry = self.parse_entry(line)
+                except (TypeError, ValueError):
+                    raise CommandError(f'Invalid entry on line {lineno}')
+
+                queue_id, natural_key, object_id, order, available_at = entry
+
+                db = queue_dbs.get(queue_id)
+                new_queue = db is None
+
+                if new_queue:
+                    db = queue_dbs[queue_id] = Queue(pk=queue_id)._get_db()
+
+                # Entries pushed together share their available_at, so
+                # each is only parsed and converted for the database once
+                try:
+                    db_available_at = db_values[db, available_at]
+                except KeyError:
+                    try:
+                        db_available_at = self.prep_available_at(
+                            available_at, db
+                        )
+                    except (TypeError, ValueError):
+                        raise CommandError(f'Invalid entry on line {lineno}')
+
+                    db_values[db, available_at] = db_available_at
+
+                if new_queue:
+                    if db not in dbs:
+                        atomic_dbs.enter_context(transaction.atomic(db))
+                        dbs.add(db)
+
+                    self.prepare_queue(queue_id)
+
+                # Entries are written to their queue's database, which may
+                # differ between queues when they are sharded.  Batches are
+                # kept to one queue so that errors can be reported with it.
+                if batch and (db != batch_db or queue_id != batch_queue_id):
+                    count += self.write_batch(
+                        batch, batch_db, batch_queue_id, batch_lineno
+                    )
+                    batch = []
+                    db_values.clear()
+
+                if not batch:
+                    batch_db = db
+                    batch_queue_id = queue_id
+                    batch_lineno = lineno
+
+                try:
+                    content_type_id = content_type_ids[natural_key]
+                except KeyError:
+                    content_type_id = self.get_content_type_id(*natural_key)
+                    content_type_ids[natural_key] = content_type_id
+
+                batch.append((
+                    queue_id, content_type_id, object_id, order,
+                    db_available_at,
+                ))
+
+                if len(batch) >= batch_size:
+                    count += self.write_batch(
+                        batch, batch_db, batch_queue_id, batch_lineno
+                    )
+                    batch = []
+                    db_values.clear()
+
+            if batch:
+                count += self.write_batch(
+                    batch, batch_db, batch_queue_id, batch_lineno
+                )
+
+        return count
+
+    def write_batch(self, batch, db, queue_id, lineno):
+        """Write the `batch` of rows for `queue_id`, read from `lineno` on
+
+        The rows are tuples of the database values of `FIELDS` and are
+        written to the `db` database.  Return the number of rows written.
+        """
+        connection = connections[db]
+
+        try:
+            with transaction.atomic(db), connection.cursor() as cursor:
+                cursor.executemany(get_insert_sql(connection), batch)
+        except IntegrityError as error:
+            raise CommandError(
+                f'Entries for queue {queue_id} on lines {lineno}-'
+                f'{lineno + len(batch) - 1} could not be loaded: {error}'
+            )
+
+        return len(batch)
+
+    def parse_entry(self, line):
+        """Parse a line of the dump into a tuple of the entry's values
+
+        The content type is returned as an `(app_label, model)` tuple.  Dumps
+        from before entries could be delayed don't have `available_at`, in
+        which case `None` is returned for it.  Raise `ValueError` (or
+        `TypeError`) if the line isn't a valid entry.
+        """
+        values = json.loads(line)
+
+        if not isinstance(values, list) or not 4 <= len(values) <= 5:
+            raise ValueError(line)
+
+        queue_id, natural_key, object_id, order = values[:4]
+
+        if not (is_id(queue_id) and queue_id > 0 and is_id(object_id)
+                and is_id(order)):
+            raise ValueError(line)
+
+        if not isinstance(natural_key, str):
+            raise TypeError(natural_key)
+
+        app_label, model = natural_key.split('.')
+
+        if len(values) > 4:
+            available_at = values[4]
+
+            if not isinstance(available_at, str):
+                raise TypeError(available_at)
+        else:
+            available_at = None
+
+        return queue_id, (app_label, model), object_id, order, available_at
+
+    def prep_available_at(self, value, db):
+        """Return the `db` database's value for the dumped `available_at`
+
+        Entries without an `available_at` are ready now.
+        """
+        if value is None:
+            available_at = timezone.now()
+        else:
+            available_at = parse_available_at(value)
+
+        field = Entry._meta.get_field('available_at')
+
+        return field.get_db_prep_save(available_at, connections[db])
+
+    def prepare_queue(self, queue_id):
+        """Ensure the queue with `queue_id` exists and is empty"""
+        queue, _ = Queue.objects.get_or_create(pk=queue_id)
+
+        if queue.entries.exists():
+            raise CommandError(f'Queue {queue_id} is not empty')
+
+    def get_content_type_id(self, app_label, model):
+        """Return the id of the `ContentType` for `app_label.model`"""
+        try:
+            content_type = ContentType.objects.get_by_natural_key(
+                app_label, model
+            )
+        except ContentType.DoesNotExist:
+            raise CommandError(f'Unknown content type {app_label}.{model}')
+
+        return content_type.pk
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queues', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='available_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['queue', 'available_at', 'order'], name='queues_entry_available'),
+        ),
+    ]
@@ -4,13 +4,25 @@ The main model here is the `Queue` models. Queues work much the way that
 you would expect of this data type, except they are Django models and
 therefore persistent. Also they (can only) contain other Django models.
 """
+import base64
+from datetime import datetime, timedelta
 from random import Random
-from typing import Iterable, Iterator, List
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Union
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models, transaction
+from django.db import models, router, transaction
 from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from queues.instrumentation import instrument
+from queues.signals import entries_added
+
+Delay = Optional[Union[timedelta, float]]
+
+# Entries given their own value per row are updated this many at a time, to
+# stay within the backends' limits on query parameters
+UPDATE_CHUNK_SIZE = 300
 
 
 class Queue(models.Model):
@@ -39,6 +51,9 @@ class Queue(models.Model):
 
         >>> q.shuffle()
 
+    Or rotated, like a `collections.deque`::
+
+        >>> q.rotate(1)
 
     To clear the `Queue` use the `.clear()` method::
 
@@ -64,76 +79,159 @@ class Queue(models.Model):
 
         >>> for pet in q:
         ...    print(pet)
+
+        >>> q[-2:]
+        [cat, dog]
+
+    Deep in large queues, page through the items with a cursor instead:
+
+        >>> page = q.page(limit=100)
+        >>> page = q.page(after=page.cursor, limit=100)
     """
     objects = models.Manager()
     random = Random()
 
-    def push(self, item: models.Model) -> 'Entry':
-        """Push an `item` into the queue"""
-        entry = Entry.objects.create(queue=self, item=item)
+    @instrument('push')
+    def push(self, item: models.Model, delay: Delay = None,
+             available_at: Optional[datetime] = None) -> 'Entry':
+        """Push an `item` into the queue
+
+        If `delay` (a `timedelta` or seconds) or `available_at` is given, the
+        item isn't ready to be popped until then.
+        """
+        available_at = get_available_at(delay, available_at)
+        entry = self.entries.create(item=item, available_at=available_at)
+        entries_added.send(sender=type(self), queue=self)
 
         return entry
 
+    @instrument('pop')
     def pop(self, index: int = 0, filter=None) -> models.Model:
         """Pop the entry at `index` (0-based) from the queue
 
+        Only entries that are ready are considered.
+
         return the item
         """
         if index >= 0:
-            queryset = self.entries.all()
+            queryset = self._ready_entries()
         else:
-            queryset = self.entries.order_by('-order')
+            queryset = self._ready_entries().order_by('-order')
             index = -index - 1
 
         if filter is not None:
             item_filter = {'queue_entry__' + k: v for k, v in filter.items()}
             queryset = queryset.filter(**item_filter)
 
-        entry = queryset[index]
-        item = entry.item
+        while True:
+            entry = queryset[index]
+
+            # Another pop may have taken the entry since it was read, in
+            # which case try the one that's at `index` now
+            deleted, _ = self.entries.filter(pk=entry.pk).delete()
+
+            if deleted:
+                return entry.item
+
+    @instrument('pop_many')
+    def pop_many(self, n: int) -> List[models.Model]:
+        """Pop (up to) `n` ready entries from the front of the queue
+
+        return the items
+        """
+        queryset = self._ready_entries().select_for_update()
 
-        entry.delete()
+        with transaction.atomic(using=self._get_db()):
+            entries = list(queryset.prefetch_related('item')[:n])
+            pks = [entry.pk for entry in entries]
+            self.entries.filter(pk__in=pks).delete()
 
-        return item
+        return [entry.item for entry in entries]
+
+    def count(self, ready_only: bool = False) -> int:
+        """Return the number of entries in the queue
+
+        If `ready_only` is `True` only count the entries that are ready.
+        """
+        if ready_only:
+            return self._ready_entries().count()
 
-    def count(self) -> int:
-        """Return the number of entries in the queue"""
         return self.entries.count()
 
+    @instrument('shuffle')
     def shuffle(self) -> None:
-        """Shuffle the entries in the queue"""
-        queryset = self.entries.select_for_update()
-        orders = list(queryset.values_list('order', flat=True))
+        """Shuffle the entries in the queue
 
-        self.random.shuffle(orders)
+        The entries are moved past the current orders with one `UPDATE` and
+        then given their shuffled orders with an `UPDATE ... CASE` per
+        `UPDATE_CHUNK_SIZE` entries.
+        """
+        queryset = self.entries.all()
 
-        with transaction.atomic():
-            queryset.update(order=None)
-            for entry, order in zip(queryset, orders):
-                entry.order = order
-                entry.save()
+        with transaction.atomic(using=self._get_db()):
+            entries = list(
+                queryset.select_for_update().values_list('pk', 'order')
+            )
+
+            if not entries:
+                return
+
+            pks = [pk for pk, _ in entries]
+            orders = [order for _, order in entries]
+            offset = max(orders) - min(orders) + 1
+
+            self.random.shuffle(orders)
 
+            # Out of the way of the shuffled orders, so the (queue, order)
+            # constraint holds for every row updated
+            queryset.update(order=models.F('order') + offset)
+
+            for start in range(0, len(pks), UPDATE_CHUNK_SIZE):
+                chunk = slice(start, start + UPDATE_CHUNK_SIZE)
+                queryset.filter(pk__in=pks[chunk]).update(order=models.Case(
+                    *(
+                        models.When(pk=pk, then=models.Value(order))
+                        for pk, order in zip(pks[chunk], orders[chunk])
+                    )
+                ))
+
+    @instrument('clear')
     def clear(self) -> None:
         """Remove all entries from the queue"""
         self.entries.all().delete()
 
-    def extend(self, iterable: Iterable) -> List['Entry']:
-        """Extend the queue by appending elements from the iterable"""
+    @instrument('extend')
+    def extend(self, iterable: Iterable, delay: Delay = None,
+               available_at: Optional[datetime] = None) -> List['Entry']:
+        """Extend the queue by appending elements from the iterable
+
+        `delay` and `available_at` are as for `push()`.
+        """
+        available_at = get_available_at(delay, available_at)
         queryset = self.entries.select_for_update()
 
-        with transaction.atomic():
+        with transaction.atomic(using=self._get_db()):
             try:
                 last_order = queryset.order_by('-order')[0].order
             except IndexError:
                 last_order = -1
 
-            entries = Entry.objects.bulk_create(
-                Entry(queue=self, item=item, order=last_order + i)
+            entries = queryset.bulk_create(
+                Entry(
+                    queue=self,
+                    item=item,
+                    order=last_order + i,
+                    available_at=available_at,
+                )
                 for i, item in enumerate(iterable, 1)
             )
 
+        if entries:
+            entries_added.send(sender=type(self), queue=self)
+
         return entries
 
+    @instrument('remove')
     def remove(self, item: models.Model) -> None:
         """Remove the first occurrence of `item`.
 
@@ -148,6 +246,7 @@ class Queue(models.Model):
 
         first_occurrence.delete()
 
+    @instrument('reverse')
     def reverse(self) -> None:
         """Reverse the items in the queue"""
         queryset = self.entries.select_for_update()
@@ -160,27 +259,233 @@ class Queue(models.Model):
 
         # TODO: when Django supports INITIALLY DEFERRED on constraints
         # change to queryset.update(order=-1 * models.F('order') + last_order)
-        with transaction.atomic():
+        with transaction.atomic(using=self._get_db()):
             queryset.update(order=None)
             for order, entry in zip(orders, queryset):
                 entry.order = -order + last_order
                 entry.save()
 
+    @instrument('rotate')
+    def rotate(self, n: int = 1) -> None:
+        """Rotate the queue `n` steps to the right
+
+        If `n` is negative, rotate to the left.  This has the same semantics
+        as `collections.deque.rotate()`.  Only the entries that move are
+        renumbered, and they are renumbered with a single `UPDATE`.
+        """
+        queryset = self.entries.all()
+        orders = queryset.values_list('order', flat=True)
+
+        with transaction.atomic(using=self._get_db()):
+            # Lock the tail first, which a concurrent push() allocates its
+            # order from, so that the queue can't grow under the count.  The
+            # entries that move are locked by the UPDATE itself.
+            last_order = self._lock_last_order()
+
+            if last_order < 0:
+                return
+
+            stats = queryset.aggregate(
+                first_order=models.Min('order'),
+                size=models.Count('pk'),
+            )
+            size = stats['size']
+            first_order = stats['first_order']
+            n = n % size
+
+            if n == 0:
+                return
+
+            # Move the smaller slice, but moving the tail to the front means
+            # renumbering it below `first_order`.  Orders can't go negative,
+            # so if there isn't enough room down there, rotate the head to
+            # the back instead.
+            if n < size - n:
+                boundary = orders.order_by('-order')[n - 1]
+
+                if first_order - (last_order - boundary) - 1 >= 0:
+                    moved = queryset.filter(order__gte=boundary)
+                    offset = first_order - last_order - 1
+                    moved.update(order=models.F('order') + offset)
+                    return
+
+            boundary = orders.order_by('order')[size - n - 1]
+            moved = queryset.filter(order__lte=boundary)
+            offset = last_order - first_order + 1
+
+            # Each moved entry lands outside of the current range of orders
+            # so the (queue, order) constraint holds for every row updated.
+            moved.update(order=models.F('order') + offset)
+
+    @instrument('compact')
+    def compact(self) -> None:
+        """Renumber the entries so that the first is at order 0
+
+        Popping from the front (and rotating) leaves the orders ever
+        increasing.  This shifts them back down.  Holes left by popping from
+        the middle of the queue are kept.
+        """
+        queryset = self.entries.all()
+
+        with transaction.atomic(using=self._get_db()):
+            stats = queryset.aggregate(
+                first_order=models.Min('order'),
+                last_order=models.Max('order'),
+            )
+            first_order = stats['first_order']
+            last_order = stats['last_order']
+
+            if not first_order:
+                return
+
+            # Shifting straight down could collide with entries that haven't
+            # been shifted yet, so first shift above the current range.
+            offset = last_order + 1
+            queryset.update(order=models.F('order') + offset)
+            queryset.update(order=models.F('order') - offset - first_order)
+
+    @instrument('move')
+    def move(self, other: 'Queue') -> None:
+        """Move all the entries in the queue to the end of `other`"""
+        if other.pk == self.pk:
+            return
+
+        if other._get_db() != self._get_db():
+            self._move_across_databases(other)
+            return
+
+        queryset = self.entries.all()
+
+        with transaction.atomic(using=self._get_db()):
+            first_order = queryset.aggregate(
+                first_order=models.Min('order')
+            )['first_order']
+
+            if first_order is None:
+                return
+
+            last_order = other._lock_last_order()
+
+            queryset.update(
+                queue=other,
+                order=models.F('order') - first_order + last_order + 1,
+            )
+
+    def _move_across_databases(self, other: 'Queue') -> None:
+        """Move all the entries to `other`, which is in another database
+
+        Entries are copied a chunk at a time, and each chunk is deleted from
+        this queue once it is copied.  This queue's entries are locked for
+        the duration, so none are popped while they are being copied, and
+        entries pushed meanwhile are picked up by the later chunks.  The two
+        databases aren't committed together though: if deleting the copied
+        entries fails they are left in both queues rather than lost.
+        """
+        queryset = self.entries.select_for_update().only(
+            'queue', 'content_type', 'object_id', 'order', 'available_at'
+        )
+
+        with transaction.atomic(using=self._get_db()):
+            for chunk in self.iter_chunks(queryset=queryset):
+                with transaction.atomic(using=other._get_db()):
+                    last_order = other._lock_last_order()
+                    other.entries.bulk_create(
+                        Entry(
+                            queue=other,
+                            content_type_id=entry.content_type_id,
+                            object_id=entry.object_id,
+                            order=last_order + i,
+                            available_at=entry.available_at,
+                        )
+                        for i, entry in enumerate(chunk, 1)
+                    )
+
+                self.entries.filter(
+                    pk__in=[entry.pk for entry in chunk]
+                ).delete()
+
+    def _lock_last_order(self) -> int:
+        """Lock the entry at the tail of the queue and return its `order`
+
+        Return -1 if the queue is empty.  A concurrent `push()` allocates its
+        order from the tail, so lock it before appending with set-based
+        updates.  Call this in a transaction.
+        """
+        orders = self.entries.select_for_update().order_by('-order')
+        last_orders = list(orders.values_list('order', flat=True)[:1])
+
+        return last_orders[0] if last_orders else -1
+
     def __iter__(self) -> Iterator:
         return iter(i.item for i in self.entries.all())
 
     def __getitem__(self, index: int) -> models.Model:
         if isinstance(index, slice):
-            return [i.item for i in self.entries.all()[index]]
+            return self._get_slice(index)
 
         if index >= 0:
-            queryset = self.entries.all()
+            queryset = self.entries.order_by('order')
         else:
             queryset = self.entries.order_by('-order')
             index = -index - 1
 
         return queryset[index].item
 
+    def page(self, after: Optional[str] = None, limit: int = 100) -> 'Page':
+        """Return a `Page` of (up to) `limit` items
+
+        `after` is the `cursor` of the previous page, or `None` for the first
+        page.  Pages seek on `order`, so every page costs the same however
+        deep it is, and entries popped or pushed in the meantime don't shift
+        the pages that follow.
+
+        Raise `ValueError` if `limit` is less than 1.
+        """
+        if limit < 1:
+            raise ValueError(f'limit must be at least 1, not {limit}')
+
+        queryset = self.entries.all()
+
+        if after is not None:
+            queryset = queryset.filter(order__gt=decode_cursor(after))
+
+        entries = list(queryset.prefetch_related('item')[:limit + 1])
+
+        if len(entries) > limit:
+            entries = entries[:limit]
+            cursor = encode_cursor(entries[-1].order)
+        else:
+            cursor = None
+
+        return Page([entry.item for entry in entries], cursor)
+
+    def iter_chunks(self, chunk_size: int = 1000,
+                    queryset: Optional[QuerySet] = None
+                    ) -> Iterator[List['Entry']]:
+        """Yield lists of (at most) `chunk_size` entries in the queue
+
+        Entries are fetched by seeking past the last `order` seen rather than
+        with OFFSET, so every chunk costs the same however deep it is.
+        `queryset` is the queue's entries to fetch, e.g. with
+        `prefetch_related('item')` or `only()`, and defaults to all of them.
+        """
+        if queryset is None:
+            queryset = self.entries.all()
+
+        queryset = queryset.order_by('order')
+        last_order = -1
+
+        while True:
+            chunk = list(queryset.filter(order__gt=last_order)[:chunk_size])
+
+            if chunk:
+                yield chunk
+
+            if len(chunk) < chunk_size:
+                break
+
+            last_order = chunk[-1].order
+
     def __contains__(self, item: models.Model) -> bool:
         """Return `True` if the instance contains `item`"""
         queryset = self._find_item_in_queue(item)
@@ -189,6 +494,84 @@ class Queue(models.Model):
 
     __len__ = count
 
+    def _order_at(self, index: int) -> int:
+        """Return the `order` of the entry at `index`
+
+        Only the `(queue, order)` index is scanned.  Raise `IndexError` if
+        there is no entry at `index`.
+        """
+        if index >= 0:
+            queryset = self.entries.order_by('order')
+        else:
+            queryset = self.entries.order_by('-order')
+            index = -index - 1
+
+        return queryset.values_list('order', flat=True)[index]
+
+    def _get_slice(self, index: slice) -> List[models.Model]:
+        """Return the list of items in the `index` slice of the queue
+
+        The bounds of the slice are turned into a range of `order`, so the
+        entries outside of the slice are never fetched.
+        """
+        start, stop, step = index.start, index.stop, index.step
+
+        if step is None:
+            step = 1
+
+        if step == 0:
+            raise ValueError('slice step cannot be zero')
+
+        if step < 0:
+            # Fetch the span of the slice forwards and step through it
+            positions = range(*index.indices(self.count()))
+
+            if not positions:
+                return []
+
+            first = min(positions)
+            items = self._get_slice(slice(first, max(positions) + 1))
+
+            return [items[i - first] for i in positions]
+
+        queryset = self.entries.all()
+
+        if start is not None:
+            try:
+                queryset = queryset.filter(order__gte=self._order_at(start))
+            except IndexError:
+                if start >= 0:
+                    return []
+                # Otherwise start is before the front of the queue
+            else:
+                if stop is not None and (start < 0) == (stop < 0):
+                    # Both bounds count from the same end, so rather than
+                    # scanning to `stop` as well, limit the entries from
+                    # `start` to the length of the slice
+                    queryset = queryset[:max(stop - start, 0)]
+                    stop = None
+
+        if stop is not None:
+            try:
+                queryset = queryset.filter(order__lt=self._order_at(stop))
+            except IndexError:
+                if stop < 0:
+                    return []
+                # Otherwise stop is past the end of the queue
+
+        entries = list(queryset)[::step]
+        models.prefetch_related_objects(entries, 'item')
+
+        return [entry.item for entry in entries]
+
+    def _ready_entries(self) -> QuerySet:
+        """Return a `QuerySet` of `self.entries` that are ready"""
+        return self.entries.filter(available_at__lte=timezone.now())
+
+    def _get_db(self) -> str:
+        """Return the database alias that the queue's entries are written to"""
+        return router.db_for_write(Entry, instance=self)
+
     def _find_item_in_queue(self, item: models.Model) -> QuerySet:
         """Return a `QuerySet` of `self.entries` containing `item`"""
         content_type = ContentType.objects.get_for_model(item)
@@ -201,6 +584,63 @@ class Queue(models.Model):
         return queryset
 
 
+class Page(NamedTuple):
+    """A page of items returned by `Queue.page()`"""
+    items: List[models.Model]
+
+    # Pass as `after` to get the next page. `None` on the last page
+    cursor: Optional[str]
+
+
+def encode_cursor(order: int) -> str:
+    """Return an opaque cursor for the entry with `order`"""
+    return base64.urlsafe_b64encode(str(order).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """Return the `order` encoded in `cursor`
+
+    Raise `ValueError` if `cursor` isn't valid.
+    """
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        raise ValueError(f'Invalid cursor {cursor!r}')
+
+
+def get_available_at(delay: Delay = None,
+                     available_at: Optional[datetime] = None) -> datetime:
+    """Return when an entry pushed with `delay` or `available_at` is ready
+
+    `delay` is a `timedelta` or a number of seconds from now.  If neither is
+    given the entry is ready now.
+    """
+    if delay is not None and available_at is not None:
+        raise ValueError('Only one of delay and available_at may be given')
+
+    if delay is not None:
+        if not isinstance(delay, timedelta):
+            delay = timedelta(seconds=delay)
+
+        return timezone.now() + delay
+
+    if available_at is not None:
+        return available_at
+
+    return timezone.now()
+
+
+class ItemForeignKey(GenericForeignKey):
+    """`GenericForeignKey` for items which may be in another database
+
+    `GenericForeignKey` looks up content types, and therefore items, in the
+    database that the entry is in.  When entries are sharded across
+    databases, items aren't.  So route content types like any other model.
+    """
+    def get_content_type(self, obj=None, id=None, using=None):
+        return super().get_content_type(obj=obj, id=id)
+
+
 class Entry(models.Model):
     """An entry in a Queue"""
     queue = models.ForeignKey(
@@ -213,7 +653,7 @@ class Entry(models.Model):
     # actual "item" (model) that this entry refers to.
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
-    item = GenericForeignKey()
+    item = ItemForeignKey()
 
     # The sequential order that this entry has in the Queue. Note that
     # because we can pop() from anywhere in the queue, holes in the
@@ -248,20 +688,33 @@ class Entry(models.Model):
     # constraint indices
     order = models.PositiveIntegerField(null=True)
 
+    # When the entry is ready to be popped.  Entries pushed with a delay
+    # are skipped by `Queue.pop()` until then.
+    available_at = models.DateTimeField(default=timezone.now)
+
     objects = models.Manager()
 
     class Meta:
         unique_together = [('queue', 'order')]
         ordering = ('queue', 'order')
+        indexes = [
+            # Keeps finding the head of the ready entries cheap even when
+            # most of the queue is delayed
+            models.Index(
+                fields=['queue', 'available_at', 'order'],
+                name='queues_entry_available',
+            ),
+        ]
 
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None) -> None:
         """Save the current instance."""
 
         cls = type(self)
+        using = using or router.db_for_write(cls, instance=self)
         queryset = (
-            cls.objects.select_for_update()
-            .filter(queue=self.queue)
+            cls.objects.using(using).select_for_update()
+            .filter(queue_id=self.queue_id)
             .order_by('-order')
         )
 
@@ -0,0 +1,173 @@
+"""Sharding queues across databases
+
+The entries of all queues normally go into one table in one database, which
+makes the `(queue, order)` index a write hotspot.  This module spreads queues
+over several databases ("shards") by their id::
+
+    DATABASE_ROUTERS = ['queues.sharding.QueueShardRouter']
+    QUEUES_SHARDS = ['shard0', 'shard1', 'shard2']
+
+`Queue` rows are created in the default database, which allocates their ids.
+Each queue is then placed on the shard `QUEUES_SHARDS[queue.pk % n]`, where
+a copy of the `Queue` row is kept and where all of its entries are written
+and read.  Every shard needs the `queues` and `contenttypes` tables, and
+items are looked up in the database they are routed to as usual.
+
+A single busy queue can also be spread over several queues (and so, shards)
+with `StripedQueue`.
+"""
+import heapq
+from random import Random
+from typing import Iterator, List, Optional, Sequence
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from queues.models import Entry, Queue
+
+
+def get_shards() -> List[str]:
+    """Return the list of database aliases that queues are sharded across"""
+    return list(getattr(settings, 'QUEUES_SHARDS', []))
+
+
+def shard_for_queue(queue_id: int) -> Optional[str]:
+    """Return the database alias for the queue with `queue_id`
+
+    Return `None` if queues aren't sharded.
+    """
+    shards = get_shards()
+
+    if not shards:
+        return None
+
+    return shards[queue_id % len(shards)]
+
+
+class QueueShardRouter:
+    """Database router that places entries on their queue's shard"""
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        return self._db_for_entries(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        return self._db_for_entries(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # Content types are the same on every shard, so entries may refer
+        # to them wherever they are
+        related = (Queue, Entry, ContentType)
+
+        for obj, other in [(obj1, obj2), (obj2, obj1)]:
+            if isinstance(obj, Entry) and isinstance(other, related):
+                return True
+
+        return None
+
+    def _db_for_entries(self, model, instance) -> Optional[str]:
+        if model is not Entry:
+            return None
+
+        if isinstance(instance, Queue) and instance.pk is not None:
+            return shard_for_queue(instance.pk)
+
+        if isinstance(instance, Entry) and instance.queue_id is not None:
+            return shard_for_queue(instance.queue_id)
+
+        return None
+
+
+@receiver(post_save, sender=Queue)
+def _create_shard_queue(sender, instance, created, using, **kwargs) -> None:
+    # The copy is made straight away so that entries can be pushed in the
+    # same transaction.  The shard isn't part of that transaction though,
+    # so a rollback leaves the (empty) copy behind, to be reused if the id
+    # is allocated again.
+    shard = shard_for_queue(instance.pk)
+
+    if created and shard is not None and using != shard:
+        Queue.objects.using(shard).get_or_create(pk=instance.pk)
+
+
+@receiver(post_delete, sender=Queue)
+def _delete_shard_queue(sender, instance, using, **kwargs) -> None:
+    # Deleting the copy deletes the queue's entries, which a rollback
+    # couldn't bring back, so wait until the delete is committed
+    shard = shard_for_queue(instance.pk)
+
+    if shard is not None and using != shard:
+        delete = Queue.objects.using(shard).filter(pk=instance.pk).delete
+        transaction.on_commit(delete, using=using)
+
+
+class StripedQueue:
+    """A queue striped across several `Queue`s
+
+    Items are pushed onto a random stripe, spreading the writes for a busy
+    queue over several queues and, when sharded, databases.  The order of
+    items is only kept within each stripe.  Across stripes the items are
+    merged by their order in their stripe::
+
+        >>> q = StripedQueue([Queue.objects.create() for _ in range(3)])
+        >>> q.push(cat)
+        >>> q.pop()  # -> cat
+    """
+    random = Random()
+
+    def __init__(self, queues: Sequence[Queue]) -> None:
+        if not queues:
+            raise ValueError('StripedQueue requires at least one queue')
+
+        self.queues = list(queues)
+
+    def push(self, item: models.Model) -> Entry:
+        """Push an `item` onto one of the stripes"""
+        stripe = self.random.choice(self.queues)
+
+        return stripe.push(item)
+
+    def pop(self) -> models.Model:
+        """Pop the item at the head of the queue
+
+        The head is the first ready item of the stripe whose first ready
+        entry has the lowest order.  Raise `IndexError` if no stripe has a
+        ready entry.
+        """
+        heads = []
+
+        for index, stripe in enumerate(self.queues):
+            orders = stripe._ready_entries().values_list('order', flat=True)
+
+            for order in orders[:1]:
+                heads.append((order, index))
+
+        for _, index in sorted(heads):
+            try:
+                return self.queues[index].pop()
+            except IndexError:
+                # Emptied since we looked
+                continue
+
+        raise IndexError('pop from an empty queue')
+
+    def count(self) -> int:
+        """Return the number of entries in all of the stripes"""
+        return sum(stripe.count() for stripe in self.queues)
+
+    __len__ = count
+
+    def __iter__(self) -> Iterator:
+        stripes = (
+            (
+                (entry.order, index, entry)
+                for chunk in stripe.iter_chunks(
+                    queryset=stripe.entries.prefetch_related('item')
+                )
+                for entry in chunk
+            )
+            for index, stripe in enumerate(self.queues)
+        )
+
+        return (entry.item for _, _, entry in heapq.merge(*stripes))
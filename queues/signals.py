@@ -0,0 +1,12 @@
+"""Signals for django queues"""
+from django.dispatch import Signal
+
+# Sent after each instrumented `Queue` operation completes.  Receivers are
+# called with `sender` (the `Queue` class), `queue` (the instance) and
+# `metrics` (an `queues.instrumentation.OperationMetrics`).
+queue_operation = Signal()
+
+# Sent when entries are added to a queue by `Queue.push()` or
+# `Queue.extend()`.  Receivers are called with `sender` (the `Queue` class)
+# and `queue` (the instance).
+entries_added = Signal()
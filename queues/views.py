@@ -1,3 +1,207 @@
-from django.shortcuts import render
+"""Views for django queues
 
-# Create your views here.
+These views are not routed or protected by default.  Wire them into your
+URLconf, wrapped in whatever authentication your project needs::
+
+    path('queues/<int:queue_id>/entries', login_required(export_entries)),
+    path('queues/<int:queue_id>/pop', login_required(pop_entry)),
+"""
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.dispatch import receiver
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET, require_POST
+
+from queues import listener
+from queues.models import Queue
+from queues.signals import entries_added
+
+CHUNK_SIZE = 1000
+
+# Longest that `pop_entry()` will hold a request, in seconds
+LONG_POLL_TIMEOUT = 30
+
+# How often, in seconds, `pop_entry()` looks for entries pushed by other
+# processes when they can't wake it.  `None` to not look until woken.
+LONG_POLL_INTERVAL: Optional[float] = None
+
+_conditions: Dict[int, threading.Condition] = {}
+_conditions_lock = threading.Lock()
+_generations: Dict[int, int] = {}
+_waiters: Dict[int, int] = {}
+
+
+def serialize_item(item: models.Model) -> dict:
+    """Return a JSON-serializable representation of `item`"""
+    return serializers.serialize('python', [item])[0]
+
+
+@require_GET
+def export_entries(request, queue_id: int) -> StreamingHttpResponse:
+    """Stream the entries of the queue as newline-delimited JSON
+
+    Each line is an object with the entry's `order`, `available_at` and its
+    serialized `item`.  Only one chunk of entries is held in memory at a time.
+    """
+    queue = get_object_or_404(Queue, pk=queue_id)
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+    def lines():
+        queryset = queue.entries.prefetch_related('item')
+
+        for chunk in queue.iter_chunks(CHUNK_SIZE, queryset):
+            for entry in chunk:
+                line = {
+                    'order': entry.order,
+                    'available_at': entry.available_at,
+                }
+                line['item'] = serialize_item(entry.item)
+
+                yield encoder.encode(line) + '\n'
+
+    return StreamingHttpResponse(
+        lines(), content_type='application/x-ndjson'
+    )
+
+
+@require_POST
+def pop_entry(request, queue_id: int) -> HttpResponse:
+    """Pop the first item off the queue
+
+    If the queue is empty, hold the request until an item is pushed or the
+    `timeout` (in seconds) given in the query string expires.  While waiting
+    the database isn't queried.  Instead waiters are woken when entries are
+    added in this process or, on PostgreSQL, in any process (see
+    `queues.listener`).  On other databases entries added by other processes
+    are only picked up when the wait times out, unless
+    `QUEUES_LONG_POLL_INTERVAL` is set to check the queue that often.
+
+    Respond with the serialized item, or 204 (No Content) on timeout.
+    """
+    queue = get_object_or_404(Queue, pk=queue_id)
+    max_timeout = getattr(settings, 'QUEUES_LONG_POLL_TIMEOUT',
+                          LONG_POLL_TIMEOUT)
+    interval = getattr(settings, 'QUEUES_LONG_POLL_INTERVAL',
+                       LONG_POLL_INTERVAL)
+
+    try:
+        timeout = float(request.GET.get('timeout', max_timeout))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid timeout')
+
+    if not math.isfinite(timeout):
+        return HttpResponseBadRequest('Invalid timeout')
+
+    deadline = time.monotonic() + min(max(timeout, 0), max_timeout)
+    db = queue._get_db()
+
+    if listener.is_supported(db):
+        listener.listen(db, notify)
+
+    with waiting(queue.pk):
+        while True:
+            generation = get_generation(queue.pk)
+
+            try:
+                item = queue.pop()
+            except IndexError:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    return HttpResponse(status=204)
+
+                if interval is not None:
+                    remaining = min(remaining, interval)
+
+                wait_for_entries(queue.pk, generation, remaining)
+            else:
+                return JsonResponse(serialize_item(item))
+
+
+@contextmanager
+def waiting(queue_id: int) -> Iterator[None]:
+    """Register as a waiter on the queue with `queue_id` for the duration
+
+    A queue's condition and generation are only kept while something is
+    waiting on it, so they don't pile up for every queue that was ever
+    pushed to.
+    """
+    with _conditions_lock:
+        if queue_id not in _conditions:
+            _conditions[queue_id] = threading.Condition()
+            _generations[queue_id] = 0
+
+        _waiters[queue_id] = _waiters.get(queue_id, 0) + 1
+
+    try:
+        yield
+    finally:
+        with _conditions_lock:
+            _waiters[queue_id] -= 1
+
+            if not _waiters[queue_id]:
+                del _waiters[queue_id]
+                del _conditions[queue_id]
+                del _generations[queue_id]
+
+
+def get_generation(queue_id: int) -> int:
+    """Return the number of times waiters on the queue have been notified
+
+    Only call this while `waiting()` on the queue.
+    """
+    with _conditions_lock:
+        return _generations[queue_id]
+
+
+def wait_for_entries(queue_id: int, generation: int, timeout: float) -> bool:
+    """Wait until entries are added to the queue or `timeout` expires
+
+    Only call this while `waiting()` on the queue.  `generation` is the
+    value of `get_generation()` from before the queue was found empty, so
+    that a notification in between isn't missed.  Return `False` if the wait
+    timed out.
+    """
+    with _conditions_lock:
+        condition = _conditions[queue_id]
+
+    with condition:
+        return condition.wait_for(
+            lambda: _generations[queue_id] != generation, timeout
+        )
+
+
+def notify(queue_id: int) -> None:
+    """Wake everything waiting on entries for the queue with `queue_id`"""
+    with _conditions_lock:
+        condition = _conditions.get(queue_id)
+
+        if condition is None:
+            # Nothing is waiting
+            return
+
+        with condition:
+            _generations[queue_id] += 1
+            condition.notify_all()
+
+
+@receiver(entries_added)
+def _entries_added(sender, queue, **kwargs) -> None:
+    # Waiters pop in their own transactions, so they mustn't be woken until
+    # the new entries are visible to them
+    transaction.on_commit(
+        functools.partial(notify, queue.pk), using=queue._get_db()
+    )
@@ -12,7 +12,12 @@ setup(
     name='django-queues',
     version='0.1',
     url='https://github.com/enku/django-queues',
-    packages=['queues', 'queues.migrations'],
+    packages=[
+        'queues',
+        'queues.management',
+        'queues.management.commands',
+        'queues.migrations',
+    ],
     include_package_data=True,
     install_requires=['Django>=2.0'],
     license='BSD',
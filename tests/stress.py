@@ -0,0 +1,391 @@
+"""Multi-process contention stress harness for queues
+
+Starts producer and consumer processes that push to and pop from one `Queue`
+in the configured database, then checks that no item was lost or popped
+more than once and that the orders in the queue stayed unique.  Each level
+of concurrency is run against a fresh queue and reported with its
+throughput and latencies::
+
+    $ DJANGO_SETTINGS_MODULE=tests.settings python -m tests.stress \\
+        --levels 1x1,2x2,4x4 --items 500
+
+Where each level is `<producers>x<consumers>`.  Point
+`DJANGO_SETTINGS_MODULE` at settings for another database to stress that
+instead.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from queue import Empty
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+# Seconds a consumer sleeps when the queue is empty
+EMPTY_SLEEP = 0.001
+
+# Failures in a row after which a worker gives up on an operation
+MAX_RETRIES = 100
+
+# Reported as an error when a worker gives up
+GAVE_UP = 'GaveUp'
+
+# Longest to wait for a worker's result, and how often to check that the
+# workers are still alive while waiting, in seconds
+RESULT_TIMEOUT = 600
+RESULT_POLL_INTERVAL = 1
+
+
+class WorkerFailed(Exception):
+    """A worker process died or didn't report back in time"""
+
+
+class WorkerResult(NamedTuple):
+    """What a producer or consumer process reports back"""
+    role: str
+    item_ids: List[int]  # pushed or popped
+    latencies: List[float]  # seconds, per successful operation
+    errors: List[str]
+    elapsed: float
+
+
+class LevelReport(NamedTuple):
+    """The outcome of running one level of concurrency"""
+    producers: int
+    consumers: int
+    pushed: int
+    popped: int
+    lost: List[int]
+    duplicated: List[int]
+    duplicate_orders: List[int]
+    errors: Counter
+    enqueue_rate: float  # per second
+    dequeue_rate: float  # per second
+    push_p50: float
+    push_p99: float
+    pop_p50: float
+    pop_p99: float
+
+    @property
+    def ok(self) -> bool:
+        return not (self.lost or self.duplicated or self.duplicate_orders
+                    or self.errors[GAVE_UP])
+
+
+def setup_django() -> None:
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+
+    import django
+    django.setup()
+
+
+def percentile(values: Sequence[float], percent: float) -> float:
+    """Return the `percent` percentile of `values` (nearest rank)"""
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    rank = math.ceil(percent / 100 * len(values))
+
+    return values[max(rank, 1) - 1]
+
+
+def rate(count: int, elapsed: Iterable[float]) -> float:
+    """Return operations per second for `count` operations
+
+    `elapsed` are the wall times of the workers, which ran concurrently.
+    """
+    elapsed = max(elapsed, default=0)
+
+    return count / elapsed if elapsed else 0.0
+
+
+def find_lost_and_duplicated(pushed: Iterable[int], popped: Iterable[int],
+                             remaining: Iterable[int]
+                             ) -> Tuple[List[int], List[int]]:
+    """Compare the pushed items with the popped and remaining ones
+
+    Return a tuple of the ids of items that were lost and items that were
+    popped (or left) more times than they were pushed.
+    """
+    pushed = Counter(pushed)
+    seen = Counter(popped) + Counter(remaining)
+    lost = sorted((pushed - seen).elements())
+    duplicated = sorted((seen - pushed).elements())
+
+    return lost, duplicated
+
+
+def produce(queue_id: int, item_ids: List[int], results) -> None:
+    """Push each of `item_ids` onto the queue
+
+    Failed pushes are retried up to `MAX_RETRIES` times before the item is
+    skipped.
+    """
+    setup_django()
+
+    from queues.models import Queue
+    from tests.models import Widget
+
+    queue = Queue.objects.get(pk=queue_id)
+    pushed = []
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+
+    for item_id in item_ids:
+        for _ in range(MAX_RETRIES + 1):
+            op_start = time.perf_counter()
+
+            try:
+                queue.push(Widget(pk=item_id))
+            except Exception as error:
+                errors.append(type(error).__name__)
+                continue
+
+            latencies.append(time.perf_counter() - op_start)
+            pushed.append(item_id)
+            break
+        else:
+            errors.append(GAVE_UP)
+
+    elapsed = time.perf_counter() - start
+    results.put(WorkerResult('producer', pushed, latencies, errors, elapsed))
+
+
+def consume(queue_id: int, producers_done, results) -> None:
+    """Pop items off the queue until it is empty and producers are done
+
+    Gives up after `MAX_RETRIES` failed pops in a row.
+    """
+    setup_django()
+
+    from queues.models import Queue
+
+    queue = Queue.objects.get(pk=queue_id)
+    popped = []
+    latencies = []
+    errors = []
+    failures = 0
+    start = time.perf_counter()
+
+    while True:
+        op_start = time.perf_counter()
+
+        try:
+            item = queue.pop()
+        except IndexError:
+            if producers_done.is_set():
+                break
+
+            time.sleep(EMPTY_SLEEP)
+            continue
+        except Exception as error:
+            errors.append(type(error).__name__)
+            failures += 1
+
+            if failures > MAX_RETRIES:
+                errors.append(GAVE_UP)
+                break
+
+            continue
+
+        failures = 0
+        latencies.append(time.perf_counter() - op_start)
+        popped.append(item.pk)
+
+    elapsed = time.perf_counter() - start
+    results.put(WorkerResult('consumer', popped, latencies, errors, elapsed))
+
+
+def run_level(producers: int, consumers: int, items: int) -> LevelReport:
+    """Run `producers` and `consumers` against a fresh queue"""
+    from django.db import connections
+    from django.db.models import Count
+
+    from queues.models import Queue
+    from tests.models import Widget
+
+    queue = Queue.objects.create()
+    widgets = Widget.objects.bulk_create(Widget() for _ in range(items))
+    item_ids = [widget.pk for widget in widgets]
+
+    if None in item_ids:
+        # The backend doesn't return ids from bulk_create()
+        item_ids = list(
+            Widget.objects.order_by('-pk').values_list('pk', flat=True)
+        )[:items]
+
+    # Children must open their own connections
+    connections.close_all()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    producers_done = context.Event()
+    producer_procs = [
+        context.Process(
+            target=produce,
+            args=(queue.pk, item_ids[i::producers], results),
+        )
+        for i in range(producers)
+    ]
+    consumer_procs = [
+        context.Process(
+            target=consume,
+            args=(queue.pk, producers_done, results),
+        )
+        for _ in range(consumers)
+    ]
+
+    processes = producer_procs + consumer_procs
+
+    for process in processes:
+        process.start()
+
+    try:
+        worker_results = get_results(results, processes, len(producer_procs))
+        producers_done.set()
+        worker_results += get_results(
+            results, processes, len(consumer_procs)
+        )
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+            process.join()
+
+    produced = [i for i in worker_results if i.role == 'producer']
+    consumed = [i for i in worker_results if i.role == 'consumer']
+    pushed = [i for result in produced for i in result.item_ids]
+    popped = [i for result in consumed for i in result.item_ids]
+    remaining = list(queue.entries.values_list('object_id', flat=True))
+    lost, duplicated = find_lost_and_duplicated(pushed, popped, remaining)
+    duplicate_orders = list(
+        queue.entries.order_by().values('order')
+        .annotate(count=Count('pk'))
+        .filter(count__gt=1)
+        .values_list('order', flat=True)
+    )
+    push_latencies = [i for result in produced for i in result.latencies]
+    pop_latencies = [i for result in consumed for i in result.latencies]
+
+    queue.delete()
+    Widget.objects.filter(
+        pk__gte=min(item_ids), pk__lte=max(item_ids)
+    ).delete()
+
+    return LevelReport(
+        producers=producers,
+        consumers=consumers,
+        pushed=len(pushed),
+        popped=len(popped),
+        lost=lost,
+        duplicated=duplicated,
+        duplicate_orders=duplicate_orders,
+        errors=Counter(i for result in worker_results for i in result.errors),
+        enqueue_rate=rate(len(pushed), (i.elapsed for i in produced)),
+        dequeue_rate=rate(len(popped), (i.elapsed for i in consumed)),
+        push_p50=percentile(push_latencies, 50),
+        push_p99=percentile(push_latencies, 99),
+        pop_p50=percentile(pop_latencies, 50),
+        pop_p99=percentile(pop_latencies, 99),
+    )
+
+
+def get_results(results, processes: Sequence, count: int
+                ) -> List[WorkerResult]:
+    """Get `count` worker results from the `results` queue
+
+    Raise `WorkerFailed` if any of the worker `processes` exits with an error
+    (without reporting back) or if the results take longer than
+    `RESULT_TIMEOUT`.
+    """
+    worker_results = []
+    deadline = time.monotonic() + RESULT_TIMEOUT
+
+    while len(worker_results) < count:
+        try:
+            worker_results.append(results.get(timeout=RESULT_POLL_INTERVAL))
+            continue
+        except Empty:
+            pass
+
+        for process in processes:
+            if process.exitcode:
+                raise WorkerFailed(
+                    f'{process.name} exited with code {process.exitcode}'
+                )
+
+        if time.monotonic() > deadline:
+            raise WorkerFailed(
+                f'timed out waiting for {count - len(worker_results)} workers'
+            )
+
+    return worker_results
+
+
+def format_report(report: LevelReport) -> str:
+    """Return a line summarizing `report`"""
+    errors = ', '.join(f'{k}: {v}' for k, v in report.errors.items())
+
+    return (
+        f'{report.producers:>3}x{report.consumers:<3} '
+        f'{report.enqueue_rate:>9.1f} {report.dequeue_rate:>9.1f} '
+        f'{report.push_p50 * 1000:>8.2f} {report.push_p99 * 1000:>8.2f} '
+        f'{report.pop_p50 * 1000:>8.2f} {report.pop_p99 * 1000:>8.2f} '
+        f'{len(report.lost):>5} {len(report.duplicated):>5} '
+        f'{len(report.duplicate_orders):>5}  {errors}'
+    )
+
+
+def parse_levels(levels: str) -> List[Tuple[int, int]]:
+    """Parse `'1x1,2x4'` into `[(1, 1), (2, 4)]`"""
+    parsed = []
+
+    for level in levels.split(','):
+        producers, _, consumers = level.partition('x')
+        parsed.append((int(producers), int(consumers or producers)))
+
+    return parsed
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--levels', type=parse_levels, default='1x1,2x2,4x4,8x8',
+        help='Comma-separated <producers>x<consumers> (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--items', type=int, default=1000,
+        help='Items pushed at each level (default: %(default)s)',
+    )
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    from django.core.management import call_command
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+    print('  PxC      enq/s     deq/s  push50  push99   pop50   pop99'
+          '  lost   dup  ords  errors')
+    reports: Dict[Tuple[int, int], LevelReport] = {}
+
+    for producers, consumers in args.levels:
+        try:
+            report = run_level(producers, consumers, args.items)
+        except WorkerFailed as error:
+            print(f'{producers:>3}x{consumers:<3} failed: {error}', flush=True)
+            return 1
+
+        reports[producers, consumers] = report
+        print(format_report(report), flush=True)
+
+    return 0 if all(i.ok for i in reports.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from queues.admin import COUNT_LIMIT, Estimate, estimate_count
+from queues.models import Entry, Queue
+from tests.test_models import create_model
+
+
+class AdminTests(TestCase):
+    """Tests for the queues admin"""
+    def setUp(self):
+        super(AdminTests, self).setUp()
+
+        user = User.objects.create_superuser('admin', 'admin@test', 'pass')
+        self.client.force_login(user)
+        self.queue = Queue.objects.create()
+
+    def test_entry_changelist_is_paginated_by_keyset(self):
+        queue = self.queue
+        items = [create_model() for _ in range(150)]
+        queue.extend(items)
+        url = reverse('admin:queues_entry_changelist')
+
+        response = self.client.get(url)
+
+        cl = response.context['cl']
+        self.assertEqual(len(cl.result_list), 100)
+        self.assertEqual(cl.next_url, f'?after={queue.pk}-99')
+        self.assertEqual(cl.result_count_display, '150')
+
+        response = self.client.get(url + cl.next_url)
+
+        cl = response.context['cl']
+        self.assertEqual([i.item for i in cl.result_list], items[100:])
+        self.assertIsNone(cl.next_url)
+
+    def test_entry_changelist_hydrates_items_in_bulk(self):
+        queue = self.queue
+        queue.extend([create_model() for _ in range(10)])
+        url = reverse('admin:queues_entry_changelist')
+
+        # Fill the caches that don't depend on the number of entries
+        self.client.get(url)
+
+        # session, user, entries, items and the count
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+    def test_entry_changelist_filtered_by_queue(self):
+        queue = self.queue
+        other = Queue.objects.create()
+        queue.push(create_model())
+        other.push(create_model())
+        url = reverse('admin:queues_entry_changelist')
+
+        response = self.client.get(url, {'queue__id__exact': other.pk})
+
+        result_list = response.context['cl'].result_list
+        self.assertEqual([i.queue_id for i in result_list], [other.pk])
+
+    def test_entry_changelist_count_from_table_statistics(self):
+        url = reverse('admin:queues_entry_changelist')
+        estimate = Estimate(50000, exact=False, capped=False)
+
+        with patch('queues.admin.estimate_count', return_value=estimate):
+            response = self.client.get(url)
+
+        cl = response.context['cl']
+        self.assertEqual(cl.result_count_display, 'about 50000')
+
+    def test_entry_changelist_capped_count(self):
+        url = reverse('admin:queues_entry_changelist')
+        estimate = Estimate(COUNT_LIMIT, exact=False, capped=True)
+
+        with patch('queues.admin.estimate_count', return_value=estimate):
+            response = self.client.get(url)
+
+        cl = response.context['cl']
+        self.assertEqual(cl.result_count_display, f'{COUNT_LIMIT}+')
+
+    def test_entry_changelist_invalid_after(self):
+        url = reverse('admin:queues_entry_changelist')
+
+        response = self.client.get(url, {'after': 'bogus'})
+
+        self.assertEqual(response.status_code, 302)
+
+    def test_move_action(self):
+        queue = self.queue
+        target = Queue.objects.create()
+        items = [create_model() for _ in range(2)]
+        queue.extend(items)
+        url = reverse('admin:queues_queue_changelist')
+
+        self.client.post(url, {
+            'action': 'move_queues',
+            '_selected_action': [queue.pk],
+            'target': target.pk,
+        })
+
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(target[:], items)
+
+    def test_clear_action(self):
+        queue = self.queue
+        queue.push(create_model())
+        url = reverse('admin:queues_queue_changelist')
+
+        self.client.post(url, {
+            'action': 'clear_queues',
+            '_selected_action': [queue.pk],
+        })
+
+        self.assertEqual(len(queue), 0)
+
+
+class EstimateCountTests(TestCase):
+    """Tests for the estimate_count() function"""
+    def test_small_counts_are_exact(self):
+        queue = Queue.objects.create()
+        queue.extend([create_model() for _ in range(3)])
+
+        queryset = Entry.objects.filter(queue=queue)
+
+        self.assertEqual(estimate_count(queryset), (3, True, False))
+
+    def test_large_counts_are_capped(self):
+        queue = Queue.objects.create()
+        queue.extend([create_model() for _ in range(3)])
+
+        queryset = Entry.objects.filter(queue=queue)
+
+        self.assertEqual(estimate_count(queryset, limit=2), (2, False, True))
+        self.assertGreater(COUNT_LIMIT, 2)
@@ -0,0 +1,139 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils.timezone import utc
+
+from queues.models import Queue
+from tests.test_models import create_model
+
+
+class DumpLoadTests(TestCase):
+    """Tests for the queues_dump and queues_load commands"""
+    def setUp(self):
+        super(DumpLoadTests, self).setUp()
+
+        self.items = [create_model() for _ in range(5)]
+        self.queue = Queue.objects.create()
+        self.queue.extend(self.items)
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'queues.ndjson')
+
+    def test_dump_writes_one_line_per_entry(self):
+        queue = self.queue
+        queue.pop(2)
+        items = self.items[:2] + self.items[3:]
+        stdout = StringIO()
+
+        call_command('queues_dump', str(queue.pk), stdout=stdout)
+
+        lines = [json.loads(i)[:4] for i in stdout.getvalue().splitlines()]
+        self.assertEqual(lines, [
+            [queue.pk, 'tests.widget', item.pk, order]
+            for item, order in zip(items, [0, 1, 3, 4])
+        ])
+
+    def test_dump_in_chunks(self):
+        queue = self.queue
+        stdout = StringIO()
+
+        call_command('queues_dump', chunk_size=2, stdout=stdout)
+
+        lines = [json.loads(i) for i in stdout.getvalue().splitlines()]
+        self.assertEqual([i[2] for i in lines], [i.pk for i in self.items])
+
+    def test_load_restores_dumped_queue(self):
+        queue = self.queue
+        queue_id = queue.pk
+        call_command('queues_dump', output=self.filename)
+        queue.delete()
+
+        call_command(
+            'queues_load', self.filename, batch_size=2, stdout=StringIO()
+        )
+
+        queue = Queue.objects.get(pk=queue_id)
+        self.assertEqual(queue[:], self.items)
+
+    def test_load_keeps_delays(self):
+        queue = self.queue
+        queue.clear()
+        queue.push(self.items[0], delay=600)
+        queue.push(self.items[1])
+        call_command('queues_dump', output=self.filename)
+        queue.clear()
+
+        call_command('queues_load', self.filename, stdout=StringIO())
+
+        self.assertEqual(queue.count(ready_only=True), 1)
+        self.assertEqual(queue.pop(), self.items[1])
+
+    def test_dump_and_load_keep_microseconds(self):
+        queue = self.queue
+        queue.clear()
+        available_at = datetime(2020, 1, 2, 3, 4, 5, 123456, tzinfo=utc)
+        queue.push(self.items[0], available_at=available_at)
+        call_command('queues_dump', output=self.filename)
+        queue.clear()
+
+        call_command('queues_load', self.filename, stdout=StringIO())
+
+        self.assertEqual(queue.entries.get().available_at, available_at)
+
+    def test_load_without_available_at(self):
+        queue = self.queue
+        queue.clear()
+
+        with open(self.filename, 'w') as fp:
+            fp.write(f'[{queue.pk}, "tests.widget", {self.items[0].pk}, 0]\n')
+
+        call_command('queues_load', self.filename, stdout=StringIO())
+
+        self.assertEqual(queue.pop(), self.items[0])
+
+    def test_load_refuses_nonempty_queue(self):
+        call_command('queues_dump', output=self.filename)
+
+        with self.assertRaises(CommandError):
+            call_command('queues_load', self.filename, stdout=StringIO())
+
+    def test_load_invalid_line(self):
+        lines = [
+            '[1, "tests.widget"]',
+            '{"queue": 1}',
+            '[1, 5, 2, 0]',
+            '["a", "tests.widget", 1, 0]',
+            '[1, "tests.widget", -1, 0]',
+            '[1, "tests.widget", 1, 0.5]',
+            '[1, "tests.widget", 1, 0, 5]',
+            '[1, "tests.widget", 1, 0, "tomorrow"]',
+            '[1, "tests", 1, 0]',
+        ]
+
+        for line in lines:
+            with open(self.filename, 'w') as fp:
+                fp.write(line + '\n')
+
+            with self.assertRaisesMessage(CommandError, 'line 1'):
+                call_command('queues_load', self.filename, stdout=StringIO())
+
+    def test_load_duplicate_order(self):
+        queue = self.queue
+        queue.clear()
+
+        with open(self.filename, 'w') as fp:
+            for object_id in [self.items[0].pk, self.items[1].pk]:
+                fp.write(f'[{queue.pk}, "tests.widget", {object_id}, 0]\n')
+
+        message = f'queue {queue.pk} on lines 1-2'
+        with self.assertRaisesMessage(CommandError, message):
+            call_command('queues_load', self.filename, stdout=StringIO())
+
+        self.assertEqual(len(queue), 0)
@@ -0,0 +1,114 @@
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from queues.instrumentation import MetricsBackend, get_backend
+from queues.models import Queue
+from queues.signals import queue_operation
+from tests.test_models import create_model
+
+
+class RecordingBackend(MetricsBackend):
+    """Metrics backend that keeps what it records"""
+    records = []
+
+    def record(self, queue, metrics):
+        self.records.append((queue, metrics))
+
+
+class InstrumentationTests(TestCase):
+    """Tests for the instrumentation of Queue operations"""
+    def setUp(self):
+        super(InstrumentationTests, self).setUp()
+
+        self.queue = Queue.objects.create()
+        self.received = []
+        queue_operation.connect(self.receiver)
+        self.addCleanup(queue_operation.disconnect, self.receiver)
+
+    def receiver(self, sender, queue, metrics, **kwargs):
+        self.received.append((sender, queue, metrics))
+
+    def test_sends_signal_with_metrics(self):
+        queue = self.queue
+
+        queue.extend([create_model(), create_model()])
+
+        sender, signal_queue, metrics = self.received[0]
+        self.assertIs(sender, Queue)
+        self.assertEqual(signal_queue, queue)
+        self.assertEqual(metrics.operation, 'extend')
+        self.assertGreater(metrics.queries, 0)
+        self.assertEqual(metrics.rows, 2)
+        self.assertGreaterEqual(metrics.duration, 0)
+        self.assertIsNone(metrics.depth)
+
+    def test_pop_metrics(self):
+        queue = self.queue
+        queue.push(create_model())
+
+        queue.pop()
+
+        metrics = self.received[-1][2]
+        self.assertEqual(metrics.operation, 'pop')
+        self.assertEqual(metrics.rows, 1)
+
+    @override_settings(QUEUES_METRICS_DEPTH=True)
+    def test_reports_operations_that_raise(self):
+        queue = self.queue
+
+        with self.assertRaises(IndexError):
+            queue.pop()
+
+        metrics = self.received[-1][2]
+        self.assertEqual(metrics.operation, 'pop')
+        self.assertEqual(metrics.error, 'IndexError')
+        self.assertGreater(metrics.queries, 0)
+        self.assertIsNone(metrics.depth)
+
+    def test_successful_operations_have_no_error(self):
+        queue = self.queue
+
+        queue.push(create_model())
+
+        self.assertIsNone(self.received[0][2].error)
+
+    def test_metrics_backend_must_implement_record(self):
+        class Backend(MetricsBackend):
+            pass
+
+        with self.assertRaises(TypeError):
+            Backend()
+
+    @override_settings(QUEUES_METRICS_DEPTH=True)
+    def test_reports_depth(self):
+        queue = self.queue
+
+        queue.push(create_model())
+
+        self.assertEqual(self.received[0][2].depth, 1)
+
+    @override_settings(
+        QUEUES_METRICS_BACKEND='tests.test_instrumentation.RecordingBackend'
+    )
+    def test_records_to_metrics_backend(self):
+        queue = self.queue
+        RecordingBackend.records.clear()
+
+        queue.push(create_model())
+
+        self.assertEqual(len(RecordingBackend.records), 1)
+        self.assertEqual(RecordingBackend.records[0][0], queue)
+        self.assertEqual(RecordingBackend.records[0][1].operation, 'push')
+
+    def test_disabled_calls_operation_directly(self):
+        queue = self.queue
+        queue_operation.disconnect(self.receiver)
+        self.assertIsNone(get_backend())
+
+        path = 'queues.instrumentation.QueryCounter'
+        with patch(path) as query_counter:
+            queue.push(create_model())
+
+        query_counter.assert_not_called()
+        self.assertEqual(self.received, [])
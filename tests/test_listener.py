@@ -0,0 +1,60 @@
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+from django.urls import reverse
+
+from queues import listener, views
+from queues.models import Queue
+from tests.test_models import create_model
+
+
+class ListenerTests(TestCase):
+    """Tests for waking waiters in other processes"""
+    def setUp(self):
+        super(ListenerTests, self).setUp()
+
+        self.queue = Queue.objects.create()
+
+    def test_push_sends_notification(self):
+        with patch('queues.listener.is_supported', return_value=True), \
+                patch('queues.listener.send') as send:
+            self.queue.push(create_model())
+
+        send.assert_called_once_with(self.queue.pk, 'default')
+
+    def test_no_notification_on_other_databases(self):
+        with patch('queues.listener.send') as send:
+            self.queue.push(create_model())
+
+        send.assert_not_called()
+
+    def test_pop_entry_listens(self):
+        url = reverse('pop_entry', args=[self.queue.pk])
+
+        with patch('queues.listener.is_supported', return_value=True), \
+                patch('queues.listener.listen') as listen:
+            self.client.post(url + '?timeout=0')
+
+        listen.assert_called_once_with('default', views.notify)
+
+    def test_listen_passes_notifications_on(self):
+        connection = MagicMock(notifies=[SimpleNamespace(payload='7')])
+        wrapper = MagicMock(**{'get_new_connection.return_value': connection})
+        listening = threading.Event()
+        received = []
+
+        # Stop listening after the first round of notifications
+        selects = [([connection], [], []), KeyboardInterrupt]
+
+        with patch('queues.listener.connections', {'db': wrapper}), \
+                patch('select.select', side_effect=selects):
+            with self.assertRaises(KeyboardInterrupt):
+                listener._listen('db', received.append, listening)
+
+        self.assertTrue(listening.is_set())
+        self.assertEqual(received, [7])
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once_with(f'LISTEN {listener.CHANNEL}')
+        connection.close.assert_called_once()
@@ -1,9 +1,13 @@
 import collections
+from datetime import timedelta
 from random import Random
 from unittest.mock import patch
 
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from queues.models import Entry, Queue
 from tests.models import Widget
@@ -55,6 +59,27 @@ class QueueTests(TestCase):
         with self.assertRaises(IndexError):
             queue.pop()
 
+    def test_pop_entry_popped_concurrently_pops_next(self):
+        queue = self.queue
+        queue.push(self.item1)
+        queue.push(self.item2)
+        first = queue.entries.all()[0]
+        stolen = []
+
+        def steal_first(execute, sql, params, many, context):
+            # Pop the first entry from under pop(), between read and delete
+            if sql.startswith('DELETE') and not stolen:
+                stolen.append(first)
+                Entry.objects.filter(pk=first.pk).delete()
+
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(steal_first):
+            item = queue.pop()
+
+        self.assertEqual(item, self.item2)
+        self.assertEqual(len(queue), 0)
+
     def test_pop_with_n_pops_nth_item(self):
         queue = self.queue
         item1 = self.item1
@@ -109,6 +134,61 @@ class QueueTests(TestCase):
 
         self.assertEqual(item, item3)
 
+    def test_pop_skips_delayed_entries(self):
+        queue = self.queue
+        item1 = self.item1
+        item2 = self.item2
+
+        queue.push(item1, delay=timedelta(minutes=10))
+        queue.push(item2)
+
+        self.assertEqual(queue.pop(), item2)
+        with self.assertRaises(IndexError):
+            queue.pop()
+        self.assertEqual(len(queue), 1)
+
+    def test_pop_delayed_entry_when_ready(self):
+        queue = self.queue
+        item1 = self.item1
+        now = timezone.now()
+
+        queue.push(item1, delay=600)
+
+        with patch('queues.models.timezone.now') as mock_now:
+            mock_now.return_value = now + timedelta(seconds=601)
+            item = queue.pop()
+
+        self.assertEqual(item, item1)
+
+    def test_push_with_delay_and_available_at_raises_valueerror(self):
+        queue = self.queue
+
+        with self.assertRaises(ValueError):
+            queue.push(self.item1, delay=1, available_at=timezone.now())
+
+    def test_pop_many_pops_ready_entries_in_order(self):
+        queue = self.queue
+        items = [create_model() for _ in range(4)]
+
+        queue.extend(items[:2])
+        queue.push(create_model(), delay=600)
+        queue.extend(items[2:])
+
+        self.assertEqual(queue.pop_many(3), items[:3])
+        self.assertEqual(queue.pop_many(3), items[3:])
+        self.assertEqual(queue.pop_many(3), [])
+        self.assertEqual(len(queue), 1)
+
+    def test_count_ready_only(self):
+        queue = self.queue
+        tomorrow = timezone.now() + timedelta(days=1)
+
+        queue.extend([self.item1, self.item2], available_at=tomorrow)
+        queue.push(self.item1)
+
+        self.assertEqual(queue.count(), 3)
+        self.assertEqual(queue.count(ready_only=True), 1)
+
     def test_count_returns_size_of_queue(self):
         queue = self.queue
         item1 = self.item1
@@ -169,6 +249,26 @@ class QueueTests(TestCase):
         self.assertEqual(queue[1], item1)
         self.assertEqual(queue[2], item2)
 
+    def test_shuffle_is_set_based(self):
+        queue = self.queue
+        items = [create_model() for _ in range(5)]
+        queue.extend(items)
+
+        with patch('queues.models.UPDATE_CHUNK_SIZE', 2):
+            with CaptureQueriesContext(connection) as context:
+                queue.shuffle()
+
+        updates = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ]
+        # shifting the orders, then 3 chunks
+        self.assertEqual(len(updates), 4)
+        self.assertCountEqual(queue[:], items)
+        self.assertCountEqual(
+            queue.entries.values_list('order', flat=True), range(5)
+        )
+
     def test_indexing(self):
         queue = self.queue
         item1 = self.item1
@@ -204,6 +304,289 @@ class QueueTests(TestCase):
         self.assertEqual(queue[1:], [item2, item3])
         self.assertEqual(queue[:2], [item1, item2])
 
+    def test_slicing_matches_list_slicing(self):
+        queue = self.queue
+        items = [create_model() for _ in range(6)]
+
+        queue.extend(items)
+        queue.pop(2)  # leave a hole in the orders
+        del items[2]
+
+        slices = [
+            slice(None), slice(1, 3), slice(-2, None), slice(None, -2),
+            slice(-4, -1), slice(1, -1), slice(-10, 2), slice(2, 10),
+            slice(10, 20), slice(3, 1), slice(None, 0), slice(0, -10),
+            slice(None, None, 2), slice(1, None, 3), slice(None, None, -1),
+            slice(-1, 0, -2), slice(3, None, -1), slice(2, 2),
+            slice(-2, -1), slice(-1, -3), slice(-10, -3), slice(1, 4, 2),
+        ]
+        for index in slices:
+            with self.subTest(index=index):
+                self.assertEqual(queue[index], items[index])
+
+    def test_slicing_with_zero_step_raises_valueerror(self):
+        queue = self.queue
+
+        with self.assertRaises(ValueError):
+            queue[::0]
+
+    def test_slicing_seeks_on_order(self):
+        queue = self.queue
+        queue.extend([create_model() for _ in range(10)])
+
+        # the order at the start, the entries and their items
+        with self.assertNumQueries(3):
+            with CaptureQueriesContext(connection) as context:
+                queue[5:7]
+
+        entries_query = context.captured_queries[-2]['sql']
+        self.assertIn('"order" >=', entries_query)
+        self.assertIn('LIMIT 2', entries_query)
+        self.assertNotIn('OFFSET', entries_query)
+
+    def test_slicing_with_bounds_from_both_ends(self):
+        queue = self.queue
+        queue.extend([create_model() for _ in range(10)])
+
+        with CaptureQueriesContext(connection) as context:
+            queue[5:-2]
+
+        entries_query = context.captured_queries[-2]['sql']
+        self.assertIn('"order" >=', entries_query)
+        self.assertIn('"order" <', entries_query)
+
+    def test_indexing_past_end_raises_indexerror(self):
+        queue = self.queue
+        queue.push(self.item1)
+
+        with self.assertRaises(IndexError):
+            queue[1]
+        with self.assertRaises(IndexError):
+            queue[-2]
+
+    def test_indexing_is_one_query_for_the_entry(self):
+        queue = self.queue
+        queue.extend([self.item1, self.item2])
+
+        # the entry and its item
+        with self.assertNumQueries(2):
+            self.assertEqual(queue[1], self.item2)
+        with self.assertNumQueries(2):
+            self.assertEqual(queue[-2], self.item1)
+
+    def test_page_through_queue(self):
+        queue = self.queue
+        items = [create_model() for _ in range(5)]
+        queue.extend(items)
+
+        page = queue.page(limit=2)
+        self.assertEqual(page.items, items[:2])
+
+        queue.pop()  # doesn't shift the next page
+        page = queue.page(after=page.cursor, limit=2)
+        self.assertEqual(page.items, items[2:4])
+
+        page = queue.page(after=page.cursor, limit=2)
+        self.assertEqual(page.items, items[4:])
+        self.assertIsNone(page.cursor)
+
+    def test_iter_chunks(self):
+        queue = self.queue
+        items = [create_model() for _ in range(5)]
+        queue.extend(items)
+        queue.pop(1)
+
+        chunks = list(queue.iter_chunks(chunk_size=2))
+
+        self.assertEqual([len(i) for i in chunks], [2, 2])
+        self.assertEqual(
+            [entry.item for chunk in chunks for entry in chunk],
+            items[:1] + items[2:],
+        )
+
+    def test_iter_chunks_hydrates_items_in_bulk(self):
+        queue = self.queue
+        queue.extend([create_model() for _ in range(4)])
+        queryset = queue.entries.prefetch_related('item')
+
+        # one query for the entries and one for the items, per chunk
+        with self.assertNumQueries(4):
+            chunks = list(queue.iter_chunks(3, queryset))
+            items = [i.item for chunk in chunks for i in chunk]
+
+        self.assertEqual([len(i) for i in chunks], [3, 1])
+        self.assertEqual(len(items), 4)
+
+    def test_page_with_invalid_cursor_raises_valueerror(self):
+        queue = self.queue
+
+        with self.assertRaises(ValueError):
+            queue.page(after='not a cursor')
+
+    def test_page_with_invalid_limit_raises_valueerror(self):
+        queue = self.queue
+
+        for limit in [0, -1]:
+            with self.assertRaises(ValueError):
+                queue.page(limit=limit)
+
+    def test_rotate_right_moves_tail_to_front(self):
+        queue = self.queue
+        items = [create_model() for _ in range(5)]
+
+        queue.extend(items)
+        queue.rotate(2)
+
+        expected = collections.deque(items)
+        expected.rotate(2)
+        self.assertEqual(queue[:], list(expected))
+
+    def test_rotate_right_with_room_below_head(self):
+        queue = self.queue
+        items = [create_model() for _ in range(5)]
+
+        queue.extend(items)
+        queue.pop()
+        queue.pop()  # head order is now 2
+        queue.rotate(1)
+
+        expected = collections.deque(items[2:])
+        expected.rotate(1)
+        self.assertEqual(queue[:], list(expected))
+        self.assertEqual(queue.entries.all()[0].order, 1)
+
+    def test_rotate_moves_the_smaller_slice(self):
+        queue = self.queue
+        items = [create_model() for _ in range(5)]
+
+        queue.extend(items)
+        queue.rotate(4)  # the same as moving the head to the back
+
+        expected = collections.deque(items)
+        expected.rotate(4)
+        self.assertEqual(queue[:], list(expected))
+        self.assertEqual(
+            list(queue.entries.values_list('order', flat=True)),
+            [1, 2, 3, 4, 5],
+        )
+
+    def test_rotate_left_moves_head_to_back(self):
+        queue = self.queue
+        items = [create_model() for _ in range(5)]
+
+        queue.extend(items)
+        queue.rotate(-2)
+
+        expected = collections.deque(items)
+        expected.rotate(-2)
+        self.assertEqual(queue[:], list(expected))
+
+    def test_rotate_more_than_length(self):
+        queue = self.queue
+        items = [create_model() for _ in range(3)]
+
+        queue.extend(items)
+        queue.rotate(7)
+
+        expected = collections.deque(items)
+        expected.rotate(7)
+        self.assertEqual(queue[:], list(expected))
+
+    def test_rotate_is_a_single_update(self):
+        queue = self.queue
+        queue.extend([create_model() for _ in range(5)])
+
+        with CaptureQueriesContext(connection) as context:
+            queue.rotate(-1)
+
+        updates = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ]
+        self.assertEqual(len(updates), 1)
+
+    def test_rotate_locks_the_tail_before_counting(self):
+        queue = self.queue
+        queue.extend([create_model() for _ in range(5)])
+        lock_last_order = Queue._lock_last_order
+
+        def lock_and_count(queue):
+            self.assertFalse(any(
+                'COUNT(' in query['sql'] for query in context.captured_queries
+            ))
+            return lock_last_order(queue)
+
+        with patch.object(Queue, '_lock_last_order', autospec=True,
+                          side_effect=lock_and_count) as mock:
+            with CaptureQueriesContext(connection) as context:
+                queue.rotate(-1)
+
+        mock.assert_called_once_with(queue)
+        # The boundary of the moved slice is looked up, not read with it
+        selects = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+        ]
+        self.assertTrue(all(
+            'COUNT(' in sql or 'LIMIT 1' in sql for sql in selects
+        ))
+
+    def test_rotate_empty_queue(self):
+        queue = self.queue
+
+        queue.rotate(3)
+
+        self.assertEqual(queue[:], [])
+
+    def test_compact_shifts_orders_to_start_at_zero(self):
+        queue = self.queue
+        items = [create_model() for _ in range(5)]
+
+        queue.extend(items)
+        queue.pop()
+        queue.pop()
+        queue.pop(1)
+        queue.compact()
+
+        self.assertEqual(queue[:], [items[2], items[4]])
+        orders = list(queue.entries.values_list('order', flat=True))
+        self.assertEqual(orders, [0, 2])
+
+    def test_move_appends_entries_to_other_queue(self):
+        queue = self.queue
+        other = Queue.objects.create()
+        item3 = create_model()
+
+        queue.extend([self.item1, self.item2])
+        other.push(item3)
+        queue.move(other)
+
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(other[:], [item3, self.item1, self.item2])
+
+    def test_move_locks_the_tail_of_other_queue(self):
+        queue = self.queue
+        other = Queue.objects.create()
+        queue.push(self.item1)
+        other.push(self.item2)
+
+        lock_last_order = Queue._lock_last_order
+
+        with patch.object(Queue, '_lock_last_order', autospec=True,
+                          side_effect=lock_last_order) as mock:
+            queue.move(other)
+
+        mock.assert_called_once_with(other)
+        self.assertEqual(other[:], [self.item2, self.item1])
+
+    def test_move_to_self_does_nothing(self):
+        queue = self.queue
+
+        queue.extend([self.item1, self.item2])
+        queue.move(queue)
+
+        self.assertEqual(queue[:], [self.item1, self.item2])
+
     def test_contains(self):
         queue = self.queue
         item1 = self.item1
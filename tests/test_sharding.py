@@ -0,0 +1,246 @@
+from io import StringIO
+from random import Random
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import TestCase, override_settings
+
+from queues.models import Entry, Queue
+from queues.sharding import StripedQueue, shard_for_queue
+from queues.signals import queue_operation
+from tests.test_models import create_model
+
+
+@override_settings(
+    DATABASE_ROUTERS=['queues.sharding.QueueShardRouter'],
+    QUEUES_SHARDS=['shard0', 'shard1'],
+)
+class ShardingTests(TestCase):
+    """Tests for sharding queues across databases"""
+    databases = {'default', 'shard0', 'shard1'}
+    multi_db = True
+
+    def setUp(self):
+        super(ShardingTests, self).setUp()
+
+        self.queue = Queue.objects.create()
+        self.shard = shard_for_queue(self.queue.pk)
+        self.item1 = create_model()
+        self.item2 = create_model()
+
+    def test_shard_for_queue(self):
+        self.assertEqual(shard_for_queue(4), 'shard0')
+        self.assertEqual(shard_for_queue(5), 'shard1')
+
+    @override_settings(QUEUES_SHARDS=[])
+    def test_shard_for_queue_when_not_sharded(self):
+        self.assertIsNone(shard_for_queue(4))
+
+    def test_queue_is_copied_to_its_shard(self):
+        queue = self.queue
+
+        self.assertTrue(
+            Queue.objects.using(self.shard).filter(pk=queue.pk).exists()
+        )
+
+    def test_push_and_pop_use_the_queues_shard(self):
+        queue = self.queue
+
+        queue.push(self.item1)
+        queue.extend([self.item2])
+
+        self.assertFalse(Entry.objects.using('default').exists())
+        entries = Entry.objects.using(self.shard).filter(queue=queue)
+        self.assertEqual(entries.count(), 2)
+
+        self.assertEqual(queue.pop(), self.item1)
+        self.assertEqual(queue[:], [self.item2])
+        self.assertEqual(entries.count(), 1)
+
+    def test_queues_are_spread_over_shards(self):
+        queues = [Queue.objects.create() for _ in range(4)]
+
+        for queue in queues:
+            queue.push(self.item1)
+
+        self.assertEqual(Entry.objects.using('shard0').count(), 2)
+        self.assertEqual(Entry.objects.using('shard1').count(), 2)
+
+    def test_set_based_operations_on_shard(self):
+        queue = self.queue
+        items = [create_model() for _ in range(4)]
+
+        queue.extend(items)
+        queue.rotate(1)
+        queue.pop()
+        queue.compact()
+
+        self.assertEqual(queue[:], items[:3])
+
+    def test_move_across_shards(self):
+        queue = self.queue
+        other = Queue.objects.create()
+        self.assertNotEqual(shard_for_queue(other.pk), self.shard)
+
+        other.push(self.item2)
+        queue.push(self.item1)
+        queue.move(other)
+
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(other[:], [self.item2, self.item1])
+
+    def test_move_across_shards_keeps_entries_pushed_meanwhile(self):
+        queue = self.queue
+        other = Queue.objects.create()
+        item3 = create_model()
+        queue.extend([self.item1, self.item2])
+        pushed = []
+
+        def push_meanwhile(execute, sql, params, many, context):
+            if sql.startswith('INSERT') and not pushed:
+                pushed.append(queue.push(item3))
+
+            return execute(sql, params, many, context)
+
+        other_db = connections[other._get_db()]
+        with other_db.execute_wrapper(push_meanwhile):
+            queue.move(other)
+
+        self.assertEqual(other[:2], [self.item1, self.item2])
+        self.assertEqual(other[2:] + queue[:], [item3])
+
+    def test_push_notifies_after_the_shard_commits(self):
+        with patch('queues.views.transaction.on_commit') as on_commit:
+            self.queue.push(self.item1)
+
+        self.assertEqual(on_commit.call_args[1]['using'], self.shard)
+
+    def test_dump_and_load_use_the_queues_shard(self):
+        queue = self.queue
+        queue.extend([self.item1, self.item2])
+        stdout = StringIO()
+
+        call_command('queues_dump', str(queue.pk), stdout=stdout)
+        queue.clear()
+        with patch('sys.stdin', StringIO(stdout.getvalue())):
+            call_command('queues_load', stdout=StringIO())
+
+        self.assertFalse(Entry.objects.using('default').exists())
+        self.assertEqual(queue[:], [self.item1, self.item2])
+
+    def test_instrumentation_counts_queries_on_shard(self):
+        queue = self.queue
+        received = []
+
+        def receiver(sender, queue, metrics, **kwargs):
+            received.append(metrics)
+
+        queue_operation.connect(receiver)
+        self.addCleanup(queue_operation.disconnect, receiver)
+        queue.extend([self.item1, self.item2])
+
+        self.assertGreater(received[0].queries, 0)
+        self.assertEqual(received[0].rows, 2)
+
+    def test_failed_load_writes_to_no_shard(self):
+        other = Queue.objects.create()
+        self.assertNotEqual(shard_for_queue(other.pk), self.shard)
+        self.queue.push(self.item1)
+        other.push(self.item2)
+        stdout = StringIO()
+
+        call_command('queues_dump', stdout=stdout)
+        self.queue.clear()
+        other.clear()
+        dump = stdout.getvalue() + 'not json\n'
+        with patch('sys.stdin', StringIO(dump)):
+            with self.assertRaises(CommandError):
+                call_command('queues_load', stdout=StringIO())
+
+        self.assertFalse(Entry.objects.using('shard0').exists())
+        self.assertFalse(Entry.objects.using('shard1').exists())
+
+    def test_stale_copy_on_shard_is_reused(self):
+        # As left behind when creating the queue was rolled back
+        stale = Queue.objects.using(self.shard).create(pk=self.queue.pk + 2)
+
+        queue = Queue.objects.create(pk=stale.pk)
+
+        self.assertEqual(shard_for_queue(queue.pk), self.shard)
+        self.assertEqual(
+            Queue.objects.using(self.shard).filter(pk=queue.pk).count(), 1
+        )
+
+    def test_delete_queue_deletes_it_from_its_shard(self):
+        queue = self.queue
+        queue.push(self.item1)
+
+        with patch('queues.sharding.transaction.on_commit') as on_commit:
+            queue.delete()
+
+            # Not until the delete is committed
+            self.assertTrue(Queue.objects.using(self.shard).exists())
+
+        on_commit.assert_called_once()
+        on_commit.call_args[0][0]()
+        self.assertFalse(Queue.objects.using(self.shard).exists())
+        self.assertFalse(Entry.objects.using(self.shard).exists())
+
+
+@override_settings(
+    DATABASE_ROUTERS=['queues.sharding.QueueShardRouter'],
+    QUEUES_SHARDS=['shard0', 'shard1'],
+)
+class StripedQueueTests(TestCase):
+    """Tests for the StripedQueue"""
+    databases = {'default', 'shard0', 'shard1'}
+    multi_db = True
+
+    def setUp(self):
+        super(StripedQueueTests, self).setUp()
+
+        self.stripes = [Queue.objects.create() for _ in range(2)]
+        self.queue = StripedQueue(self.stripes)
+
+    def test_push_spreads_items_over_stripes(self):
+        queue = self.queue
+        items = [create_model() for _ in range(10)]
+
+        with patch.object(StripedQueue, 'random', Random(1)):
+            for item in items:
+                queue.push(item)
+
+        self.assertEqual(len(queue), 10)
+        self.assertTrue(all(len(stripe) for stripe in self.stripes))
+
+    def test_iteration_merges_stripes_by_order(self):
+        stripe0, stripe1 = self.stripes
+        items = [create_model() for _ in range(5)]
+
+        stripe0.extend([items[0], items[2], items[4]])
+        stripe1.extend([items[1], items[3]])
+
+        self.assertEqual(list(self.queue), items)
+
+    def test_pop_takes_lowest_head(self):
+        stripe0, stripe1 = self.stripes
+        item1 = create_model()
+        item2 = create_model()
+
+        stripe0.extend([item1, item2])
+        stripe0.pop()
+        stripe1.push(item1)
+
+        self.assertEqual(self.queue.pop(), item1)
+        self.assertEqual(len(stripe1), 0)
+        self.assertEqual(self.queue.pop(), item2)
+
+    def test_pop_empty_raises_indexerror(self):
+        with self.assertRaises(IndexError):
+            self.queue.pop()
+
+    def test_requires_queues(self):
+        with self.assertRaises(ValueError):
+            StripedQueue([])
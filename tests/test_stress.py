@@ -0,0 +1,78 @@
+import queue
+from collections import Counter
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from tests.stress import (
+    GAVE_UP, LevelReport, WorkerFailed, WorkerResult,
+    find_lost_and_duplicated, get_results, parse_levels, percentile, rate,
+)
+
+
+class StressHarnessTests(TestCase):
+    """Tests for the stress harness' bookkeeping"""
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3, 1, 2], 100), 3)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_rate_uses_longest_worker(self):
+        self.assertEqual(rate(100, [1.0, 2.0]), 50.0)
+        self.assertEqual(rate(0, []), 0.0)
+
+    def test_find_lost_and_duplicated(self):
+        lost, duplicated = find_lost_and_duplicated(
+            pushed=[1, 2, 3, 4, 4],
+            popped=[1, 2, 2, 4],
+            remaining=[4],
+        )
+
+        self.assertEqual(lost, [3])
+        self.assertEqual(duplicated, [2])
+
+    def test_parse_levels(self):
+        self.assertEqual(parse_levels('1x1,2x4,8'), [(1, 1), (2, 4), (8, 8)])
+
+    def test_report_ok(self):
+        report = LevelReport(
+            producers=1, consumers=1, pushed=1, popped=1, lost=[],
+            duplicated=[], duplicate_orders=[], errors=Counter(),
+            enqueue_rate=1.0, dequeue_rate=1.0, push_p50=0.0, push_p99=0.0,
+            pop_p50=0.0, pop_p99=0.0,
+        )
+
+        self.assertIs(report.ok, True)
+        self.assertIs(report._replace(duplicated=[1]).ok, False)
+        gave_up = Counter({'OperationalError': 101, GAVE_UP: 1})
+        self.assertIs(report._replace(errors=gave_up).ok, False)
+
+    @patch('tests.stress.RESULT_POLL_INTERVAL', 0.01)
+    def test_get_results(self):
+        results = queue.Queue()
+        result = WorkerResult('producer', [1], [0.1], [], 0.1)
+        results.put(result)
+        processes = [SimpleNamespace(name='producer', exitcode=0)]
+
+        self.assertEqual(get_results(results, processes, 1), [result])
+
+    @patch('tests.stress.RESULT_POLL_INTERVAL', 0.01)
+    def test_get_results_when_a_worker_dies(self):
+        processes = [
+            SimpleNamespace(name='producer', exitcode=None),
+            SimpleNamespace(name='consumer', exitcode=1),
+        ]
+
+        with self.assertRaises(WorkerFailed):
+            get_results(queue.Queue(), processes, 1)
+
+    @patch('tests.stress.RESULT_POLL_INTERVAL', 0.01)
+    @patch('tests.stress.RESULT_TIMEOUT', 0)
+    def test_get_results_times_out(self):
+        processes = [SimpleNamespace(name='producer', exitcode=None)]
+
+        with self.assertRaises(WorkerFailed):
+            get_results(queue.Queue(), processes, 1)
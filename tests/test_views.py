@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.urls import reverse
+
+from queues import views
+from queues.models import Queue
+from tests.test_models import create_model
+
+
+class ExportEntriesTests(TestCase):
+    """Tests for the export_entries view"""
+    def setUp(self):
+        super(ExportEntriesTests, self).setUp()
+
+        self.queue = Queue.objects.create()
+
+    def test_streams_ndjson(self):
+        queue = self.queue
+        items = [create_model(category_id=i) for i in range(5)]
+        queue.extend(items)
+        url = reverse('export_entries', args=[queue.pk])
+
+        with patch('queues.views.CHUNK_SIZE', 2):
+            response = self.client.get(url)
+            content = b''.join(response.streaming_content)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(i) for i in content.decode().splitlines()]
+        self.assertEqual([i['order'] for i in lines], [0, 1, 2, 3, 4])
+        self.assertEqual([i['item']['pk'] for i in lines],
+                         [i.pk for i in items])
+        self.assertEqual(lines[3]['item']['fields'], {'category_id': 3})
+
+    def test_unknown_queue(self):
+        url = reverse('export_entries', args=[9999])
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 404)
+
+
+class PopEntryTests(TestCase):
+    """Tests for the pop_entry view"""
+    def setUp(self):
+        super(PopEntryTests, self).setUp()
+
+        self.queue = Queue.objects.create()
+        self.url = reverse('pop_entry', args=[self.queue.pk])
+
+    def test_pops_item(self):
+        queue = self.queue
+        item = create_model()
+        queue.push(item)
+
+        response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['pk'], item.pk)
+        self.assertEqual(len(queue), 0)
+
+    def test_times_out_when_empty(self):
+        response = self.client.post(self.url + '?timeout=0.05')
+
+        self.assertEqual(response.status_code, 204)
+
+    def test_waits_for_a_wakeup_without_polling(self):
+        with patch('queues.views.wait_for_entries') as wait_for_entries:
+            wait_for_entries.side_effect = lambda *args: time.sleep(0.06)
+
+            with self.assertNumQueries(3):
+                # The queue and a pop attempt before and after waiting
+                self.client.post(self.url + '?timeout=0.05')
+
+        wait_for_entries.assert_called_once()
+        # for the whole timeout
+        self.assertGreater(wait_for_entries.call_args[0][2], 0.04)
+
+    def test_rechecks_queue_every_interval(self):
+        with patch('queues.views.wait_for_entries') as wait_for_entries:
+            with self.settings(QUEUES_LONG_POLL_INTERVAL=0.01):
+                self.client.post(self.url + '?timeout=0.05')
+
+        for call in wait_for_entries.call_args_list:
+            self.assertLessEqual(call[0][2], 0.01)
+
+        self.assertGreater(wait_for_entries.call_count, 1)
+
+    def test_invalid_timeout(self):
+        response = self.client.post(self.url + '?timeout=soon')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_finite_timeout(self):
+        for timeout in ['nan', 'inf', '-inf']:
+            response = self.client.post(self.url + '?timeout=' + timeout)
+
+            self.assertEqual(response.status_code, 400)
+
+    def test_requires_post(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 405)
+
+
+class NotifyTests(TestCase):
+    """Tests for waking long-poll waiters"""
+    def test_notify_wakes_waiter(self):
+        result = []
+
+        with views.waiting(-1):
+            generation = views.get_generation(-1)
+            waiter = threading.Thread(
+                target=lambda: result.append(
+                    views.wait_for_entries(-1, generation, 5)
+                )
+            )
+            waiter.start()
+
+            views.notify(-1)
+            waiter.join(5)
+
+        self.assertEqual(result, [True])
+
+    def test_notification_before_wait_is_not_lost(self):
+        with views.waiting(-2):
+            generation = views.get_generation(-2)
+
+            views.notify(-2)
+
+            self.assertIs(views.wait_for_entries(-2, generation, 0), True)
+
+    def test_notify_without_waiters(self):
+        views.notify(-3)
+
+        self.assertNotIn(-3, views._conditions)
+        self.assertNotIn(-3, views._generations)
+
+    def test_last_waiter_leaving_forgets_queue(self):
+        with views.waiting(-4):
+            with views.waiting(-4):
+                pass
+
+            self.assertIn(-4, views._conditions)
+
+        self.assertNotIn(-4, views._conditions)
+        self.assertNotIn(-4, views._generations)
+        self.assertNotIn(-4, views._waiters)
+
+    def test_push_notifies_after_commit(self):
+        queue = Queue.objects.create()
+
+        with patch('queues.views.transaction.on_commit') as on_commit:
+            queue.push(create_model())
+
+        on_commit.assert_called_once()
+        callback = on_commit.call_args[0][0]
+
+        with views.waiting(queue.pk):
+            generation = views.get_generation(queue.pk)
+            callback()
+            self.assertEqual(views.get_generation(queue.pk), generation + 1)
@@ -16,6 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from queues import views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('queues/<int:queue_id>/entries', views.export_entries,
+         name='export_entries'),
+    path('queues/<int:queue_id>/pop', views.pop_entry, name='pop_entry'),
 ]